@@ -0,0 +1,218 @@
+"""
+Measures how plan compilation and the scenario hooks scale with the size and the shape of a scenario.
+
+    python benchmarks/bench_collection.py [--sizes 1000,10000,100000] [--json results.json] [--baseline old.json]
+
+Every case generates a synthetic project (sut/scenarios layout, a test module and its fixtures) in a temporary
+directory and runs a collect-only session in it, timing generate_test_plan, pytest_pycollect_makeitem,
+pytest_generate_tests and pytest_collection_modifyitems. Cases of up to --run-max instances also run their tests to
+time the fixture binding done per test in pytest_runtest_logstart and the run history every cached scenario run
+records for --scenario-incremental, --scenario-failfirst and --scenario-shard. Results are reported per instance, so a hook
+that scales worse than linearly stands out across sizes, and compared with --baseline when given.
+
+Cases:
+    flat        a single scenario file with N instances
+    wide        a scenario referencing one sub-scenario sqrt(N) times, each expanding into sqrt(N) instances
+    deep        a chain of 100 nested sub-scenarios holding N instances in total
+    bindings    N instances binding 8 parametrized fixtures each
+"""
+__author__ = 'orim'
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_FUNCTIONS = 10
+DEEP_LEVELS = 100
+TEST_MODULE = '''import pytest
+
+
+def make_fixture(name):
+    @pytest.fixture(name=name)
+    def fixture(request):
+        return getattr(request, 'param', None)
+    return fixture
+
+
+for index in range({fixtures}):
+    globals()['fixture_%d' % index] = make_fixture('fixture_%d' % index)
+
+
+class TestBench:
+{tests}
+'''
+TEST_FUNCTION = '''
+    def test_{index}(self, {arguments}test_param):
+        pass
+'''
+
+
+def test_module(fixtures):
+    arguments = ''.join('bound_%d, ' % index for index in range(fixtures))
+    tests = ''.join(TEST_FUNCTION.format(index=index, arguments=arguments) for index in range(TEST_FUNCTIONS))
+    return TEST_MODULE.format(fixtures=fixtures, tests=tests)
+
+
+def record(record_id, index, fixtures):
+    return {
+        'id': record_id,
+        'module_name': 'tests.test_bench',
+        'class_name': 'TestBench',
+        'test_name': 'test_%d' % (index % TEST_FUNCTIONS),
+        'fixture_binding': {'bound_%d' % fixture: {'func': 'fixture_%d' % fixture, 'scope': 'module',
+                                                   'params': {'value': index % 10}}
+                            for fixture in range(fixtures)},
+        'test_params': {'test_param': index},
+        'skip': False,
+        'xfail': False,
+    }
+
+
+def flat_case(size):
+    return {'bench': [record(index, index, 1) for index in range(size)]}, 1, size
+
+
+def wide_case(size):
+    width = max(int(math.sqrt(size)), 1)
+    return {'bench': [{'id': index, '@ref': 'leaf'} for index in range(width)],
+            'leaf': [record(index, index, 1) for index in range(width)]}, 1, width * width
+
+
+def deep_case(size):
+    per_level = max(size // DEEP_LEVELS, 1)
+    scenarios = {}
+    for level in range(DEEP_LEVELS):
+        name = 'bench' if level == 0 else 'level %d' % level
+        records = [record(index, level * per_level + index, 1) for index in range(per_level)]
+        if level + 1 < DEEP_LEVELS:
+            records.append({'id': per_level, '@ref': 'level %d' % (level + 1)})
+        scenarios[name] = records
+    return scenarios, 1, per_level * DEEP_LEVELS
+
+
+def bindings_case(size):
+    return {'bench': [record(index, index, 8) for index in range(size)]}, 8, size
+
+
+TIMED_HOOKS = ('generate_test_plan', 'pytest_pycollect_makeitem', 'pytest_generate_tests',
+               'pytest_collection_modifyitems', 'pytest_runtest_logstart', 'recording')
+CASES = {'flat': flat_case, 'wide': wide_case, 'deep': deep_case, 'bindings': bindings_case}
+
+
+def create_project(project_dir, scenarios, fixtures):
+    os.makedirs(os.path.join(project_dir, 'sut', 'scenarios'))
+    os.makedirs(os.path.join(project_dir, 'tests'))
+    open(os.path.join(project_dir, 'tests', '__init__.py'), 'w').close()
+    with open(os.path.join(project_dir, 'tests', 'test_bench.py'), 'w') as module_file:
+        module_file.write(test_module(fixtures))
+    for name, records in scenarios.items():
+        with open(os.path.join(project_dir, 'sut', 'scenarios', name + '.json'), 'w') as scenario_file:
+            json.dump(records, scenario_file)
+
+
+def run_session(project_dir, collect_only):
+    results_path = os.path.join(project_dir, 'hooks.json')
+    args = [sys.executable, '-m', 'pytest', 'tests', '--scenario=bench', '-q', '-p', 'hook_timer',
+            '--scenario-banner=none', '--scenario-report=compact', '--scenario-cache-clear']
+    if collect_only:
+        args.append('--collect-only')
+    environment = dict(os.environ, SCENARIO_BENCH_RESULTS=results_path,
+                       PYTHONPATH=os.pathsep.join(filter(None, [BENCH_DIR, os.environ.get('PYTHONPATH')])))
+    started = time.perf_counter()
+    process = subprocess.run(args, cwd=project_dir, env=environment, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    wall_time = time.perf_counter() - started
+    if process.returncode not in (0, 5):
+        raise RuntimeError("benchmark session failed:\n" + process.stdout.decode())
+    with open(results_path) as results_file:
+        return wall_time, json.load(results_file)
+
+
+def run_case(case, size, run_max):
+    project_dir = tempfile.mkdtemp(prefix='pytest-scenario-bench-')
+    try:
+        scenarios, fixtures, instances = CASES[case](size)
+        create_project(project_dir, scenarios, fixtures)
+        wall_time, hooks = run_session(project_dir, collect_only=True)
+        result = {'case': case, 'size': size, 'instances': instances, 'collect_seconds': wall_time, 'hooks': hooks}
+        if size <= run_max:
+            wall_time, run_hooks = run_session(project_dir, collect_only=False)
+            result['run_seconds'] = wall_time
+            result['hooks']['pytest_runtest_logstart'] = run_hooks['pytest_runtest_logstart']
+            result['hooks']['recording'] = {
+                'seconds': sum(timing['seconds'] for hook, timing in run_hooks.items() if hook.startswith('recording_')),
+                'calls': run_hooks['recording_pytest_sessionfinish']['calls']}
+        return result
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+
+
+def per_instance(result, hook):
+    return result['hooks'][hook]['seconds'] / result['instances'] * 1e6
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    baseline = {(result['case'], result['size']): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['case'], result['size']))
+        if previous is None:
+            continue
+        for hook, timing in sorted(result['hooks'].items()):
+            previous_timing = previous['hooks'].get(hook)
+            if not timing['calls'] or not previous_timing or not previous_timing['calls']:
+                continue
+            if timing['seconds'] > max(previous_timing['seconds'] * tolerance, min_seconds):
+                regressions.append('{} {} {}: {:.3f}s (baseline {:.3f}s)'.format(
+                    result['case'], result['size'], hook, timing['seconds'], previous_timing['seconds']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="comma separated numbers of scenario instances (default is 1000,10000,100000)")
+    parser.add_argument('--cases', default=','.join(sorted(CASES)), help="comma separated cases to run")
+    parser.add_argument('--run-max', type=int, default=10000,
+                        help="largest case whose tests are run to time per-test fixture binding")
+    parser.add_argument('--json', dest='json_path', default=None, help="write the results to a JSON file")
+    parser.add_argument('--baseline', default=None, help="JSON results of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help="slowdown factor of a hook against the baseline reported as a regression")
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help="hooks faster than this are too noisy to be reported as a regression")
+    options = parser.parse_args()
+
+    results = []
+    print('{:<10}{:>8}  {:>10}{:>10}{:>10}{:>10}{:>10}{:>10}  (us per instance)'.format(
+        'case', 'size', 'plan', 'makeitem', 'generate', 'modify', 'binding', 'history'))
+    for size in (int(size) for size in options.sizes.split(',')):
+        for case in options.cases.split(','):
+            result = run_case(case, size, options.run_max)
+            results.append(result)
+            timings = ('{:>10.1f}'.format(per_instance(result, hook))
+                       if result['hooks'].get(hook, {}).get('calls') else
+                       '{:>10}'.format('-') for hook in TIMED_HOOKS)
+            print('{:<10}{:>8}  {}'.format(case, result['instances'], ''.join(timings)))
+
+    regressions = []
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), options.tolerance,
+                                  options.min_seconds)
+    if options.json_path:
+        with open(options.json_path, 'w') as json_file:
+            json.dump({'python': sys.version.split()[0], 'results': results, 'regressions': regressions},
+                      json_file, indent=2)
+    for regression in regressions:
+        print('regression: ' + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
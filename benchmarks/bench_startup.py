@@ -0,0 +1,83 @@
+"""
+Measures what pytest-scenario adds to the startup of every pytest run.
+
+    python benchmarks/bench_startup.py [--runs 10] [--json results.json]
+
+Reports the import time of the plugin module and the wall time of a collect-only run with the plugin disabled,
+enabled but unused, and running a scenario. Exits with 1 when the import time or the overhead of an unused plugin
+exceeds its budget.
+"""
+__author__ = 'orim'
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SNIPPET = ("import time, pytest; started = time.perf_counter(); import pytest_scenario.plugin; "
+                  "print(time.perf_counter() - started)")
+
+
+def run_import(runs):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_SNIPPET], cwd=ROOT_DIR)
+        timings.append(float(output.decode().strip()))
+    return timings
+
+
+def run_pytest(runs, args):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.call([sys.executable, '-m', 'pytest', '--collect-only', '-q', '-p', 'no:cacheprovider'] + args,
+                        cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--scenario', default='main scenario')
+    parser.add_argument('--tests', default='tests')
+    parser.add_argument('--import-budget-ms', type=float, default=25.0,
+                        help="maximal median import time of pytest_scenario.plugin")
+    # the overhead includes resolving the plugin's setuptools entry point, which pytest does for every run
+    parser.add_argument('--overhead-budget-ms', type=float, default=75.0,
+                        help="maximal median overhead of the plugin on a run that does not use --scenario")
+    parser.add_argument('--json', dest='json_path', default=None, help="also write the results to a JSON file")
+    options = parser.parse_args()
+
+    results = {
+        'import': run_import(options.runs),
+        'disabled': run_pytest(options.runs, [options.tests, '-p', 'no:scenario']),
+        'enabled': run_pytest(options.runs, [options.tests]),
+        'scenario': run_pytest(options.runs, [options.tests, '--scenario={}'.format(options.scenario)]),
+    }
+    medians = {name: statistics.median(timings) * 1000 for name, timings in results.items()}
+    medians['overhead'] = medians['enabled'] - medians['disabled']
+    medians['scenario overhead'] = medians['scenario'] - medians['disabled']
+    for name in ('import', 'disabled', 'enabled', 'scenario', 'overhead', 'scenario overhead'):
+        print('{:<20}{:>10.1f} ms'.format(name, medians[name]))
+
+    failures = []
+    if medians['import'] > options.import_budget_ms:
+        failures.append('plugin import takes {:.1f} ms (budget {:.1f} ms)'.format(medians['import'],
+                                                                                 options.import_budget_ms))
+    if medians['overhead'] > options.overhead_budget_ms:
+        failures.append('unused plugin adds {:.1f} ms (budget {:.1f} ms)'.format(medians['overhead'],
+                                                                                options.overhead_budget_ms))
+    if options.json_path:
+        with open(options.json_path, 'w') as json_file:
+            json.dump({'runs': options.runs, 'median_ms': medians, 'failures': failures}, json_file, indent=2)
+    for failure in failures:
+        print('over budget: ' + failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
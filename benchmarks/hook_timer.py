@@ -0,0 +1,44 @@
+"""
+pytest plugin used by bench_collection.py: times the scenario runner's plan compilation and hooks.
+
+Loaded with ``-p hook_timer``, it wraps the TestScenarioRunner and IncrementalRun methods below before they are
+instantiated and writes the accumulated wall time and call count of each of them as JSON to $SCENARIO_BENCH_RESULTS
+when pytest exits.
+"""
+__author__ = 'orim'
+import json
+import os
+import time
+from pytest_scenario.incremental import IncrementalRun
+from pytest_scenario.plugin import TestScenarioRunner
+from pytest_scenario.profiling import wraps_hook
+
+TIMED_METHODS = ('generate_test_plan', 'pytest_pycollect_makeitem', 'pytest_generate_tests',
+                 'pytest_collection_modifyitems', 'pytest_runtest_logstart')
+# the run history every cached scenario run records, timed under their own names
+RECORDING_METHODS = ('pytest_collection_modifyitems', 'pytest_runtest_logreport', 'pytest_sessionfinish')
+timings = {name: [0.0, 0] for name in TIMED_METHODS + tuple('recording_' + name for name in RECORDING_METHODS)}
+
+
+def timed(name, method):
+    @wraps_hook(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings[name][0] += time.perf_counter() - started
+            timings[name][1] += 1
+    return wrapper
+
+
+for method_name in TIMED_METHODS:
+    setattr(TestScenarioRunner, method_name, timed(method_name, getattr(TestScenarioRunner, method_name)))
+for method_name in RECORDING_METHODS:
+    setattr(IncrementalRun, method_name, timed('recording_' + method_name, getattr(IncrementalRun, method_name)))
+
+
+def pytest_unconfigure(config):
+    with open(os.environ['SCENARIO_BENCH_RESULTS'], 'w') as results_file:
+        json.dump({name: {'seconds': seconds, 'calls': calls} for name, (seconds, calls) in timings.items()},
+                  results_file)
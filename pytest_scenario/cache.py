@@ -0,0 +1,80 @@
+__author__ = 'orim'
+import json
+import os
+from os.path import abspath
+from urllib.parse import quote
+
+PLAN_CACHE_VERSION = 8
+
+
+def cache_file_name(scenario_name, suffix):
+    # scenario names may hold a sub directory of sut/scenarios, every scenario gets a single file in the cache directory
+    return quote(scenario_name, safe=' ,') + suffix
+
+
+class PlanCache(object):
+    # an expanded plan stays valid as long as every scenario file it was built from keeps its mtime and size.
+    # it is stored as JSON Lines, a header line and then a line per test instance, so it is streamed like the scenario
+    # files it was built from rather than loaded as a whole
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _plan_path(self, scenario_name):
+        return os.path.join(self.cache_dir, cache_file_name(scenario_name, '.plan.jsonl'))
+
+    @staticmethod
+    def fingerprint(file_path):
+        stat = os.stat(file_path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def load(self, scenario_name):
+        # an iterator of the cached [fully qualified name, instance id, test instance] entries, None when stale
+        try:
+            plan_file = open(self._plan_path(scenario_name))
+        except OSError:
+            return None
+        try:
+            header = json.loads(plan_file.readline())
+            if not isinstance(header, dict) or header.get('version') != PLAN_CACHE_VERSION:
+                raise ValueError()
+            for file_path, fingerprint in header['files'].items():
+                if self.fingerprint(file_path) != fingerprint:
+                    raise ValueError()
+        except (OSError, ValueError, KeyError):
+            plan_file.close()
+            return None
+        return self._iter_tests(plan_file)
+
+    @staticmethod
+    def _iter_tests(plan_file):
+        with plan_file:
+            for line in plan_file:
+                yield json.loads(line)
+
+    def store(self, scenario_name, scenario_files, tests):
+        header = {
+            'version': PLAN_CACHE_VERSION,
+            'files': {abspath(file_path): self.fingerprint(file_path) for file_path in scenario_files},
+        }
+        plan_path = self._plan_path(scenario_name)
+        # worker processes may store the same plan at the same time, and a plan that can not be cached is only slower
+        tmp_path = '%s.%d.tmp' % (plan_path, os.getpid())
+        encode = json.JSONEncoder(separators=(',', ':')).encode
+        try:
+            with open(tmp_path, 'w') as plan_file:
+                plan_file.write(encode(header) + '\n')
+                for test in tests:
+                    plan_file.write(encode(test) + '\n')
+            os.replace(tmp_path, plan_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def clear(self, scenario_name):
+        try:
+            os.remove(self._plan_path(scenario_name))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,133 @@
+__author__ = 'orim'
+import asyncio
+import functools
+import inspect
+import time
+from _pytest.runner import CallInfo, call_and_report, check_interactive_exception
+from pytest_scenario.params import intern_params
+
+
+def binding_key(test):
+    return tuple(sorted((argname, fixture_config.get('func', None), fixture_config.get('scope', None),
+                         intern_params(fixture_config.get('params', None)))
+                        for argname, fixture_config in test.get('fixture_binding', {}).items()))
+
+
+def is_async(item):
+    return inspect.iscoroutinefunction(getattr(item, 'function', None))
+
+
+def concurrent_batch(items, index, item_tests):
+    # consecutive async instances of one concurrency group that bind the same fixtures the same way, instances
+    # binding differently would tear down each other's higher scoped fixture values while they are still running
+    test = item_tests.get(items[index].nodeid)
+    if test is None or test.get('concurrency_group', None) is None or not is_async(items[index]):
+        return None
+    group, key = test['concurrency_group'], binding_key(test)
+    batch = [items[index]]
+    for item in items[index + 1:]:
+        test = item_tests.get(item.nodeid)
+        if test is None or test.get('concurrency_group', None) != group or not is_async(item) or \
+                binding_key(test) != key:
+            break
+        batch.append(item)
+    return batch
+
+
+_NOT_SET = object()
+
+
+def _park_function_fixtures(item):
+    # takes the values of the item's function scoped fixtures off their fixture defs, so that the next instance of
+    # the batch sets up values of its own. they are given back right before the item's teardown finalizes them
+    parked = []
+    for fixture_def in item._request._fixture_defs.values():
+        if getattr(fixture_def, 'scope', None) == 'function' and hasattr(fixture_def, '_finalizer'):
+            parked.append((fixture_def, getattr(fixture_def, 'cached_result', _NOT_SET), fixture_def._finalizer))
+            fixture_def._finalizer = []
+            if hasattr(fixture_def, 'cached_result'):
+                del fixture_def.cached_result
+    return parked
+
+
+def _restore_function_fixtures(parked):
+    for fixture_def, cached_result, finalizers in parked:
+        fixture_def._finalizer = finalizers
+        if cached_result is not _NOT_SET:
+            fixture_def.cached_result = cached_result
+
+
+async def _semaphore(limit):
+    # asyncio primitives belong to the loop running when they are created, which has to be the batch's loop
+    return asyncio.Semaphore(limit)
+
+
+async def _run_test(function, kwargs, semaphore, timing):
+    async with semaphore:
+        timing.append(time.time())
+        try:
+            await function(**kwargs)
+        finally:
+            timing.append(time.time())
+
+
+def _awaiting(function, task, loop):
+    # stands in for the test function while pytest runs the item's call phase: waits for the task running the test
+    # along with the rest of the batch, and returns or raises what the test did
+    @functools.wraps(function)
+    def call_test(*args, **kwargs):
+        return loop.run_until_complete(task)
+    return call_test
+
+
+def run_concurrently(items, nextitem, loop, limit):
+    # every instance is set up, then all of them are started on the event loop at once (at most limit at a time) and
+    # the call phase of each runs pytest's call hooks while waiting for its own test, then every instance is torn
+    # down. a set up instance is taken off pytest's setup stack, with its finalizers and its function scoped fixture
+    # values, until its teardown so that setting up the next one neither tears it down nor shares those values
+    setup_state = items[0].session._setupstate
+    semaphore = loop.run_until_complete(_semaphore(limit))
+    parked = {}
+    ready = []
+    for item in items:
+        if hasattr(item, '_request') and not item._request:
+            item._initrequest()
+        item.ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+        report = call_and_report(item, 'setup')
+        if setup_state.stack and setup_state.stack[-1] is item:
+            setup_state.stack.pop()
+            parked[item] = (setup_state._finalizers.pop(item, []), _park_function_fixtures(item))
+        if report.passed and not item.config.option.setuponly:
+            ready.append(item)
+    tasks = []
+    for item in ready:
+        timing = []
+        kwargs = {argname: item.funcargs[argname] for argname in item._fixtureinfo.argnames}
+        tasks.append((item, loop.create_task(_run_test(item.obj, kwargs, semaphore, timing)), timing))
+    for item, task, timing in tasks:
+        function = item.obj
+        item.obj = _awaiting(function, task, loop)
+        try:
+            call = CallInfo(lambda: item.ihook.pytest_runtest_call(item=item), 'call')
+        finally:
+            item.obj = function
+        if len(timing) == 2:
+            call.start, call.stop = timing
+        report = item.ihook.pytest_runtest_makereport(item=item, call=call)
+        item.ihook.pytest_runtest_logreport(report=report)
+        if check_interactive_exception(call, report):
+            item.ihook.pytest_exception_interact(node=item, call=call, report=report)
+    pending = [task for _, task, _ in tasks if not task.done()]
+    if pending:
+        # a plugin took over a call phase without calling the test
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+    for index, item in enumerate(items):
+        if item in parked:
+            finalizers, function_fixtures = parked.pop(item)
+            setup_state.stack.append(item)
+            setup_state._finalizers[item] = finalizers
+            _restore_function_fixtures(function_fixtures)
+        call_and_report(item, 'teardown', nextitem=items[index + 1] if index + 1 < len(items) else nextitem)
+        if hasattr(item, '_request'):
+            item._request = False
+            item.funcargs = None
@@ -0,0 +1,72 @@
+__author__ = 'orim'
+import itertools
+from pytest_scenario.exceptions import ImproperlyConfigured
+
+MATRIX_DIRECTIVE = '@matrix'
+RANGE_DIRECTIVE = '@range'
+DIRECTIVES = (MATRIX_DIRECTIVE, RANGE_DIRECTIVE)
+
+
+def has_directives(record):
+    return MATRIX_DIRECTIVE in record or RANGE_DIRECTIVE in record
+
+
+def _range(value, record_id):
+    if not isinstance(value, list) or not 1 <= len(value) <= 3 or not all(isinstance(arg, int) for arg in value):
+        raise ImproperlyConfigured("{} of record {} should be a list of 1 to 3 integers: [start,] stop[, step]"
+                                   .format(RANGE_DIRECTIVE, record_id))
+    return range(*value)
+
+
+def _copies(value, record_id):
+    # a record level @range only repeats the record, its copies differ by their index alone
+    if not isinstance(value, list) or len(value) != 1 or not isinstance(value[0], int) or isinstance(value[0], bool):
+        raise ImproperlyConfigured("{0} of record {1} repeats it and should be a [count], a {{\"{0}\": [start, stop, "
+                                   "step]}} leaf of {2} hands a field a range of values"
+                                   .format(RANGE_DIRECTIVE, record_id, MATRIX_DIRECTIVE))
+    return value[0]
+
+
+def _matrix_axes(matrix, record_id, path=()):
+    # the matrix mirrors the record, every leaf is a list of values or a {"@range": [...]} to take the product over
+    if isinstance(matrix, list):
+        return [(path, matrix)]
+    if isinstance(matrix, dict):
+        if list(matrix) == [RANGE_DIRECTIVE]:
+            return [(path, _range(matrix[RANGE_DIRECTIVE], record_id))]
+        axes = []
+        for key, value in matrix.items():
+            axes.extend(_matrix_axes(value, record_id, path + (key,)))
+        return axes
+    raise ImproperlyConfigured("{} of record {} should map fields to lists of values, found {!r} at {}"
+                               .format(MATRIX_DIRECTIVE, record_id, matrix, '.'.join(path) or 'its root'))
+
+
+def _assign(record, path, value):
+    # mappings along the path are copied, everything else is shared between the expanded records
+    target = record
+    for key in path[:-1]:
+        child = target.get(key)
+        child = dict(child) if isinstance(child, dict) else {}
+        target[key] = child
+        target = child
+    target[path[-1]] = value
+
+
+def expand_record(record):
+    # lazily yields (index, record) for every combination of the record's @range copies and @matrix values
+    record_id = record.get('id')
+    base_record = {field: value for field, value in record.items() if field not in DIRECTIVES}
+    axes = _matrix_axes(record.get(MATRIX_DIRECTIVE, {}), record_id)
+    if any(path == () for path, _ in axes):
+        raise ImproperlyConfigured("{} of record {} should be a mapping".format(MATRIX_DIRECTIVE, record_id))
+    copies = _copies(record[RANGE_DIRECTIVE], record_id) if RANGE_DIRECTIVE in record else 1
+    index = 0
+    # itertools.product materializes its inputs, the copies of a large @range are walked one at a time instead
+    for _ in range(copies):
+        for combination in itertools.product(*(values for _, values in axes)):
+            expanded_record = dict(base_record)
+            for (path, _), value in zip(axes, combination):
+                _assign(expanded_record, path, value)
+            yield index, expanded_record
+            index += 1
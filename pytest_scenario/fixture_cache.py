@@ -0,0 +1,131 @@
+__author__ = 'orim'
+from _pytest.fixtures import FixtureDef
+
+_INVALIDATED = object()
+
+
+def _dependent_fixture_def(finalizer):
+    # pytest registers the finish() of every fixture depending on a fixture value as a finalizer of that value
+    fixture_def = getattr(finalizer, '__self__', None)
+    if isinstance(fixture_def, FixtureDef) and finalizer.__name__ == 'finish':
+        return fixture_def
+    return None
+
+
+class FixtureValueCache(object):
+    # decides whether a bound fixture can reuse a value or has to be set up again. every value a fixture was set up
+    # with is kept, by scope and params, until pytest finalizes the fixture (its scope ends) or it is invalidated: a
+    # binding with params reuses the value set up with the same scope and params, a binding without params reuses
+    # whatever value is current. pytest holds a single value per fixture, so the others are parked with their
+    # finalizers while another one is current
+
+    def __init__(self):
+        # fixture def -> ((scope, params), pytest's cached_result the key belongs to)
+        self.entries = {}
+        # fixture def -> {(scope, params): (cached_result, finalizers)} of the values that are not current
+        self.parked = {}
+        # fixture name -> [hits, misses, invalidations]
+        self.statistics = {}
+
+    def count(self, func, index):
+        try:
+            self.statistics[func][index] += 1
+        except KeyError:
+            self.statistics[func] = [0, 0, 0]
+            self.statistics[func][index] += 1
+
+    def prepare(self, func, fixture_def, scope, params):
+        scope = scope or fixture_def.scope
+        key = (scope, params)
+        cached_result = getattr(fixture_def, 'cached_result', None)
+        entry = self.entries.get(fixture_def)
+        if entry is _INVALIDATED:
+            if cached_result is not None:
+                fixture_def.finish()
+            self.finalized(fixture_def)
+            cached_result = entry = None
+        if cached_result is not None and scope == fixture_def.scope:
+            if entry is None or entry[1] is not cached_result:
+                # set up by pytest itself, only reusable by a binding that does not ask for specific params
+                hit = params is None
+            else:
+                hit = params is None or entry[0] == key
+            if hit:
+                self.count(func, 0)
+                return
+        # taken out while the current value is finished, which would finalize them too
+        parked = self.parked.pop(fixture_def, {})
+        if cached_result is not None:
+            if entry is not None and entry[1] is cached_result and entry[0][0] != 'function':
+                parked[entry[0]] = self.park(fixture_def)
+            else:
+                fixture_def.finish()
+        if parked:
+            self.parked[fixture_def] = parked
+        fixture_def.scope = scope
+        if key in parked:
+            cached_result, fixture_def._finalizer = parked.pop(key)
+            fixture_def.cached_result = cached_result
+            self.entries[fixture_def] = (key, cached_result)
+            self.count(func, 0)
+            return
+        self.count(func, 1)
+        self.entries[fixture_def] = (key, None)
+
+    def park(self, fixture_def):
+        # takes the current value off the fixture def. fixtures set up from it are torn down, they are set up again
+        # from the next one
+        for finalizer in list(fixture_def._finalizer):
+            dependent_fixture_def = _dependent_fixture_def(finalizer)
+            if dependent_fixture_def is not None:
+                fixture_def._finalizer.remove(finalizer)
+                dependent_fixture_def.finish()
+        value = (fixture_def.cached_result, fixture_def._finalizer)
+        fixture_def._finalizer = []
+        del fixture_def.cached_result
+        return value
+
+    def stored(self, fixture_def):
+        # called once the fixture value was computed, ties the key to the value pytest cached
+        key, _ = self.entries.get(fixture_def) or (None, None)
+        if key is not None:
+            self.entries[fixture_def] = (key, getattr(fixture_def, 'cached_result', None))
+
+    def finalized(self, fixture_def):
+        # pytest finalized the current value, the parked ones go with it
+        parked = self.parked.pop(fixture_def, None)
+        self.entries.pop(fixture_def, None)
+        errors = []
+        for _, finalizers in (parked or {}).values():
+            while finalizers:
+                try:
+                    finalizers.pop()()
+                except Exception as e:
+                    errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def invalidate(self, func=None):
+        # the current value is torn down by the next instance binding the fixture, not while a test may still use it,
+        # and the parked values along with it
+        for fixture_def in list(self.entries):
+            if func is None or fixture_def.argname == func:
+                if self.entries[fixture_def] is not _INVALIDATED:
+                    self.entries[fixture_def] = _INVALIDATED
+                    self.count(fixture_def.argname, 2)
+
+    def clear(self):
+        for fixture_def in list(self.parked):
+            self.finalized(fixture_def)
+        self.entries.clear()
+
+    def report(self, terminalreporter):
+        if not self.statistics:
+            return
+        hits = sum(statistics[0] for statistics in self.statistics.values())
+        misses = sum(statistics[1] for statistics in self.statistics.values())
+        terminalreporter.write_sep("-", "scenario fixture cache: {} hits, {} misses".format(hits, misses))
+        if terminalreporter.verbosity > 0:
+            for func, (hits, misses, invalidations) in sorted(self.statistics.items()):
+                terminalreporter.write_line("{}: {} hits, {} misses, {} invalidations"
+                                            .format(func, hits, misses, invalidations))
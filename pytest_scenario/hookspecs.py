@@ -0,0 +1,7 @@
+__author__ = 'orim'
+
+
+def pytest_scenario_profile(config, timings):
+    """ called at the end of a --scenario-profile session with a list of
+    {'phase', 'scenario', 'calls', 'seconds'} dicts, one per phase and
+    scenario or sub-scenario the plugin spent time on. """
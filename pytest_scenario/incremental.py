@@ -0,0 +1,182 @@
+__author__ = 'orim'
+import hashlib
+import inspect
+import json
+import os
+import pytest
+from pytest_scenario.cache import cache_file_name
+
+# parts of a record that follow from its position in the plan rather than from its content
+PLAN_FIELDS = ('order', 'scenario', 'depends_on', 'serial_group')
+
+
+def outcomes_path(cache_dir, scenario_name):
+    return os.path.join(cache_dir, cache_file_name(scenario_name, '.outcomes.json'))
+
+
+def load_history(path):
+    # nodeid -> [fingerprint, outcome, duration] (entries of older runs do not have a duration)
+    try:
+        with open(path) as outcomes_file:
+            return json.load(outcomes_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_durations(path):
+    return {nodeid: entry[2] for nodeid, entry in load_history(path).items() if len(entry) > 2}
+
+
+class IncrementalRun(object):
+    # remembers a fingerprint, the outcome and the duration of every scenario instance that ran, with select_changed
+    # only the scheduling units holding an instance whose fingerprint changed or which did not pass last time are kept
+    # (in their scenario order)
+
+    def __init__(self, runner, cache_dir, select_changed=False, record=True, failfirst=False):
+        self.runner = runner
+        self.outcomes_path = outcomes_path(cache_dir, runner._name)
+        self.select_changed = select_changed
+        self.failfirst = failfirst
+        self.record = record
+        self.previous_outcomes = load_history(self.outcomes_path)
+        self.fingerprints = {}
+        self.outcomes = {}
+        # nodeid -> [total duration, runs], an instance repeated N times is recorded with its mean duration
+        self.durations = {}
+        self.source_digests = {}
+        # (test function, fixture bindings) -> digest of their sources, shared by all the instances of a test
+        self.code_digests = {}
+        self.selection = None
+        self.moved_ahead = None
+
+    def source_digest(self, func):
+        try:
+            return self.source_digests[func]
+        except KeyError:
+            pass
+        try:
+            source = inspect.getsource(func)
+        except (OSError, TypeError):
+            source = getattr(func, '__qualname__', repr(func))
+        digest = self.source_digests[func] = hashlib.sha1(source.encode()).hexdigest()
+        return digest
+
+    def code_digest(self, item):
+        _, fixture_bindings = self.runner.item_setup_dict.get(item.nodeid, (None, ()))
+        key = (item.function, tuple((argname, fixture_def) for argname, _, _, _, fixture_def in fixture_bindings))
+        try:
+            return self.code_digests[key]
+        except KeyError:
+            pass
+        digest = hashlib.sha1(self.source_digest(item.function).encode())
+        for argname, fixture_def in key[1]:
+            digest.update(argname.encode())
+            if fixture_def is not None:
+                digest.update(fixture_def.baseid.encode())
+                digest.update(self.source_digest(fixture_def.func).encode())
+        digest = self.code_digests[key] = digest.hexdigest()
+        return digest
+
+    def fingerprint(self, item, test):
+        record = {field: value for field, value in test.items() if field not in PLAN_FIELDS}
+        record_json = json.dumps(record, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha1((record_json + self.code_digest(item)).encode()).hexdigest()
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, config, items):
+        if config.option.collectonly and not (self.select_changed or self.failfirst):
+            return
+        unchanged = set()
+        scenario_items = []
+        for item in items:
+            test = self.runner.item_tests.get(item.nodeid)
+            if test is None:
+                continue
+            scenario_items.append(item)
+            fingerprint = self.fingerprints[item.nodeid] = self.fingerprint(item, test)
+            if self.previous_outcomes.get(item.nodeid, [])[:2] in ([fingerprint, 'passed'], [fingerprint, 'skipped']):
+                unchanged.add(id(item))
+        if self.select_changed:
+            from pytest_scenario.scheduling import scheduling_units
+            # an instance runs along with the whole unit it belongs to, e.g. the instance that set up the fixture
+            # value it reuses
+            for unit in scheduling_units(scenario_items, self.runner.item_tests):
+                if not all(id(item) in unchanged for item in unit):
+                    unchanged.difference_update(id(item) for item in unit)
+            selected = [item for item in items if id(item) not in unchanged]
+            deselected = [item for item in items if id(item) in unchanged]
+            for item in deselected:
+                self.runner.item_setup_dict.pop(item.nodeid, None)
+            self.selection = (len(selected), len(items))
+            if deselected:
+                config.hook.pytest_deselected(items=deselected)
+                items[:] = selected
+        if self.failfirst and self.previous_outcomes:
+            items[:] = self.failures_first(items)
+
+    def failures_first(self, items):
+        # instances that failed last time run first, then new or changed ones, cheapest first in both groups, then
+        # the rest in scenario order. scheduling units move as a whole, in their own order: serial sub-scenarios,
+        # depends_on chains and instances reusing the fixture value an earlier instance set up
+        from pytest_scenario.scheduling import scheduling_units
+        known_durations = [entry[2] for entry in self.previous_outcomes.values() if len(entry) > 2]
+        default_duration = sum(known_durations) / len(known_durations) if known_durations else 0.0
+        ranked_units = []
+        for position, unit in enumerate(scheduling_units(items, self.runner.item_tests)):
+            rank = 2
+            duration = 0.0
+            for item in unit:
+                entry = self.previous_outcomes.get(item.nodeid)
+                if entry is not None and entry[1] == 'failed':
+                    rank = 0
+                elif entry is None or entry[0] != self.fingerprints.get(item.nodeid):
+                    rank = min(rank, 1)
+                duration += entry[2] if entry is not None and len(entry) > 2 else default_duration
+            if rank < 2:
+                ranked_units.append((rank, duration, position, unit))
+        ranked_units.sort(key=lambda ranked_unit: ranked_unit[:3])
+        self.moved_ahead = [sum(len(unit) for rank, _, _, unit in ranked_units if rank == wanted_rank)
+                            for wanted_rank in (0, 1)]
+        moved_items = [item for _, _, _, unit in ranked_units for item in unit]
+        moved = set(id(item) for item in moved_items)
+        return moved_items + [item for item in items if id(item) not in moved]
+
+    def pytest_collection_finish(self, session):
+        terminalreporter = session.config.pluginmanager.getplugin('terminalreporter')
+        if self.selection:
+            terminalreporter.write_line("incremental run: {} of {} scenario instances changed, did not pass last time "
+                                        "or run along with one that did".format(*self.selection), bold=True)
+        if self.moved_ahead:
+            terminalreporter.write_line("failfirst ordering: {} instances moved ahead for failures of last time and {} "
+                                        "for new or changed ones, along with the instances they need"
+                                        .format(*self.moved_ahead), bold=True)
+
+    def pytest_runtest_logreport(self, report):
+        if report.nodeid not in self.fingerprints:
+            return
+        duration = self.durations.get(report.nodeid)
+        if duration is None:
+            duration = self.durations[report.nodeid] = [0.0, 0]
+        duration[0] += report.duration
+        if report.when == 'teardown':
+            duration[1] += 1
+        if report.failed:
+            self.outcomes[report.nodeid] = 'failed'
+        elif report.skipped and self.outcomes.get(report.nodeid) != 'failed':
+            self.outcomes[report.nodeid] = 'skipped'
+        elif report.when == 'call' and report.nodeid not in self.outcomes:
+            self.outcomes[report.nodeid] = 'passed'
+
+    def pytest_sessionfinish(self, session):
+        if not self.record or not self.outcomes:
+            return
+        # instances that did not run keep what is known about them from earlier runs
+        outcomes = dict(self.previous_outcomes)
+        for nodeid, outcome in self.outcomes.items():
+            total_duration, runs = self.durations.get(nodeid, (0.0, 0))
+            outcomes[nodeid] = [self.fingerprints[nodeid], outcome, total_duration / max(runs, 1)]
+        temporary_path = '%s.%d.tmp' % (self.outcomes_path, os.getpid())
+        with open(temporary_path, 'w') as outcomes_file:
+            # dumps encodes in one go (in C), dump would stream it through the pure Python encoder
+            outcomes_file.write(json.dumps(outcomes, separators=(',', ':')))
+        os.replace(temporary_path, self.outcomes_path)
@@ -0,0 +1,155 @@
+__author__ = 'orim'
+import json
+import math
+import numbers
+import pytest
+from pytest_scenario.exceptions import ImproperlyConfigured
+
+PHASES = ('setup', 'call', 'teardown')
+PERCENTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+# budgets given as a plain number are checked against this statistic
+DEFAULT_BUDGET_STATISTIC = 'p95'
+BUDGET_STATISTICS = ('count', 'mean', 'max') + tuple(name for name, _ in PERCENTILES)
+
+
+def budget_errors(budget):
+    # what is wrong with a record's latency_budget, e.g. {"call": 0.2, "setup": {"p99": 1.5, "max": 3}}
+    if not isinstance(budget, dict):
+        return ["latency_budget should map phases ({}) to budgets".format(', '.join(PHASES))]
+    errors = []
+    for phase, phase_budget in sorted(budget.items()):
+        if phase not in PHASES:
+            errors.append("unknown latency_budget phase '{}' (use {})".format(phase, ', '.join(PHASES)))
+            continue
+        if not isinstance(phase_budget, dict):
+            phase_budget = {DEFAULT_BUDGET_STATISTIC: phase_budget}
+        for statistic, limit in sorted(phase_budget.items()):
+            if statistic not in BUDGET_STATISTICS:
+                errors.append("unknown latency_budget statistic '{}' of {} (use {})"
+                              .format(statistic, phase, ', '.join(BUDGET_STATISTICS)))
+            elif not isinstance(limit, numbers.Real) or isinstance(limit, bool):
+                errors.append("latency_budget {} {} should be a number of seconds".format(phase, statistic))
+    return errors
+
+
+class LatencyHistogram(object):
+    # log-scaled buckets: percentiles are exact to within BUCKET_GROWTH and memory does not depend on sample count
+    __slots__ = ('count', 'total', 'maximum', 'buckets')
+    BUCKET_GROWTH = 1.05
+    MIN_DURATION = 1e-6
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.buckets = {}
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.maximum = max(self.maximum, duration)
+        if duration <= self.MIN_DURATION:
+            bucket = 0
+        else:
+            bucket = int(math.ceil(math.log(duration / self.MIN_DURATION, self.BUCKET_GROWTH)))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def upper_bound(self, bucket):
+        return self.MIN_DURATION * self.BUCKET_GROWTH ** bucket
+
+    def percentile(self, fraction):
+        rank = max(1, int(math.ceil(fraction * self.count)))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.upper_bound(bucket), self.maximum)
+        return self.maximum
+
+    def statistics(self):
+        statistics = {'count': self.count, 'mean': self.total / self.count if self.count else 0.0,
+                      'max': self.maximum}
+        for name, fraction in PERCENTILES:
+            statistics[name] = self.percentile(fraction)
+        return statistics
+
+    def to_dict(self):
+        latency = self.statistics()
+        latency['histogram'] = [[self.upper_bound(bucket), self.buckets[bucket]] for bucket in sorted(self.buckets)]
+        return latency
+
+
+class LatencyRecorder(object):
+
+    def __init__(self, runner, report_path=None, enforce_budgets=False):
+        self.runner = runner
+        self.report_path = report_path
+        self.enforce_budgets = enforce_budgets
+        self.latencies = {}
+        self.violations = []
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, config, items):
+        for item in items:
+            test = self.runner.item_tests.get(item.nodeid)
+            if test is not None and 'latency_budget' in test:
+                errors = budget_errors(test['latency_budget'])
+                if errors:
+                    raise ImproperlyConfigured('{}: {}'.format(test['id'], '; '.join(errors)))
+
+    def pytest_runtest_logreport(self, report):
+        if report.skipped:
+            return
+        test = self.runner.item_tests.get(report.nodeid)
+        if test is None:
+            return
+        histograms = self.latencies.get(test['id'])
+        if histograms is None:
+            histograms = self.latencies[test['id']] = (test, {})
+        histogram = histograms[1].get(report.when)
+        if histogram is None:
+            histogram = histograms[1][report.when] = LatencyHistogram()
+        histogram.add(report.duration)
+
+    def budget_violations(self):
+        violations = []
+        for test_id, (test, histograms) in sorted(self.latencies.items()):
+            for phase, budget in sorted(test.get('latency_budget', {}).items()):
+                if phase not in histograms:
+                    continue
+                if not isinstance(budget, dict):
+                    budget = {DEFAULT_BUDGET_STATISTIC: budget}
+                statistics = histograms[phase].statistics()
+                for statistic, limit in sorted(budget.items()):
+                    if statistics[statistic] > limit:
+                        violations.append((test_id, phase, statistic, statistics[statistic], limit))
+        return violations
+
+    def pytest_sessionfinish(self, session, exitstatus):
+        self.violations = self.budget_violations()
+        if self.report_path:
+            instances = {}
+            for test_id, (test, histograms) in self.latencies.items():
+                instances[test_id] = {phase: histograms[phase].to_dict() for phase in PHASES if phase in histograms}
+                if 'latency_budget' in test:
+                    instances[test_id]['budget'] = test['latency_budget']
+            with open(self.report_path, 'w') as report_file:
+                json.dump({'scenario': self.runner._name,
+                           'instances': instances,
+                           'violations': [{'id': test_id, 'phase': phase, 'statistic': statistic,
+                                           'value': value, 'budget': limit}
+                                          for test_id, phase, statistic, value, limit in self.violations]},
+                          report_file, indent=2, sort_keys=True)
+        if self.enforce_budgets and self.violations and session.exitstatus == 0:
+            session.exitstatus = 1
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.report_path:
+            terminalreporter.write_line("latency report written to {}".format(self.report_path))
+        if not self.violations:
+            return
+        terminalreporter.write_sep("=", "latency budget exceeded", red=self.enforce_budgets,
+                                   yellow=not self.enforce_budgets)
+        for test_id, phase, statistic, value, limit in self.violations:
+            terminalreporter.write_line("{} {} {}: {:.3f}ms (budget {:.3f}ms)"
+                                        .format(test_id, phase, statistic, value * 1000, limit * 1000))
@@ -0,0 +1,118 @@
+__author__ = 'orim'
+import json
+import sys
+from pytest_scenario.exceptions import ImproperlyConfigured
+
+SCENARIO_FILE_EXTENSIONS = ('.json', '.jsonl')
+# fields of a test case record the plugin actually reads, anything else is dropped while loading
+SCENARIO_FIELDS = ('id', '@ref', '@matrix', '@range', 'serial', 'depends_on', 'module_name', 'class_name',
+                   'test_name', 'test_params', 'fixture_binding', 'skip', 'xfail', 'latency_budget',
+                   'concurrency_group')
+INTERNED_FIELDS = ('@ref', 'module_name', 'class_name', 'test_name')
+CHUNK_SIZE = 1 << 16
+
+
+def iter_scenario_records(scenario_file_path):
+    with open(scenario_file_path) as scenario_file:
+        if scenario_file_path.endswith('.jsonl'):
+            records = _iter_json_lines(scenario_file)
+        else:
+            records = _iter_json_array(scenario_file)
+        for line_number, record in records:
+            if not isinstance(record, dict):
+                raise ImproperlyConfigured("test case record at {}:{} is not a JSON object"
+                                           .format(scenario_file_path, line_number))
+            yield _compact_record(record)
+
+
+def _compact_record(record):
+    compact_record = {}
+    for field in SCENARIO_FIELDS:
+        try:
+            value = record[field]
+        except KeyError:
+            continue
+        if field in INTERNED_FIELDS and isinstance(value, str):
+            value = sys.intern(value)
+        compact_record[field] = value
+    return compact_record
+
+
+def _iter_json_lines(scenario_file):
+    for line_number, line in enumerate(scenario_file, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            raise ImproperlyConfigured("invalid test case record at {}:{} ({})"
+                                       .format(scenario_file.name, line_number, e))
+
+
+def _iter_json_array(scenario_file):
+    # decodes one array element at a time, so only a single chunk and a single record are held in memory
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    line_number = 1
+    eof = False
+    expect_separator = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = scenario_file.read(CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def skip_whitespace():
+        nonlocal position, line_number
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                if buffer[position] == '\n':
+                    line_number += 1
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    def error(message):
+        return ImproperlyConfigured("{} at {}:{}".format(message, scenario_file.name, line_number))
+
+    skip_whitespace()
+    if buffer[position:position + 1] != '[':
+        raise error("a scenario should be a JSON array of test case records")
+    position += 1
+    while True:
+        skip_whitespace()
+        if position >= len(buffer):
+            raise error("unexpected end of scenario")
+        if buffer[position] == ']':
+            position += 1
+            skip_whitespace()
+            if position < len(buffer):
+                raise error("unexpected content after the scenario's array")
+            return
+        if expect_separator:
+            if buffer[position] != ',':
+                raise error("expected ',' between test case records")
+            position += 1
+            skip_whitespace()
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except ValueError as e:
+                if eof:
+                    raise error("invalid test case record ({})".format(e))
+                fill()
+                continue
+            # a value ending exactly at the buffer boundary might continue in the next chunk
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            break
+        yield line_number, record
+        line_number += buffer.count('\n', position, end)
+        position = end
+        expect_separator = True
@@ -0,0 +1,107 @@
+__author__ = 'orim'
+import inspect
+import tracemalloc
+import pytest
+
+TOP_ENTRIES = 5
+TRACEBACK_DEPTH = 1
+
+
+def format_size(size):
+    return '{:+.1f} KiB'.format(size / 1024.0)
+
+
+class MemoryTracker(object):
+    # compares tracemalloc snapshots between repetitions, growth is attributed to the scenario instances that were
+    # running while it happened and to fixtures or tests owning the allocating source lines
+
+    def __init__(self, runner):
+        self.runner = runner
+        self.snapshot = None
+        self.instance_growth = {}
+        self.code_owners = {}
+        self.started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEBACK_DEPTH)
+            self.started_tracing = True
+        self.snapshot = self.take_snapshot()
+
+    def stop(self):
+        self.snapshot = None
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    @staticmethod
+    def take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+
+    def register_code_owner(self, label, func):
+        try:
+            lines, first_line = inspect.getsourcelines(func)
+            filename = inspect.getsourcefile(func)
+        except (OSError, TypeError):
+            return
+        self.code_owners.setdefault(filename, []).append((first_line, first_line + len(lines) - 1, label))
+
+    def code_owner(self, filename, line_number):
+        for first_line, last_line, label in self.code_owners.get(filename, ()):
+            if first_line <= line_number <= last_line:
+                return label
+        return None
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items):
+        registered = set()
+        for item in items:
+            fixture_info = getattr(item, '_fixtureinfo', None)
+            for argname, fixture_defs in getattr(fixture_info, 'name2fixturedefs', {}).items():
+                for fixture_def in fixture_defs:
+                    if fixture_def.func not in registered:
+                        registered.add(fixture_def.func)
+                        self.register_code_owner('fixture {}'.format(fixture_def.argname), fixture_def.func)
+            function = getattr(item, 'function', None)
+            if function is not None and function not in registered:
+                registered.add(function)
+                self.register_code_owner('test {}'.format(function.__name__), function)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        if self.snapshot is None:
+            yield
+            return
+        size_before = tracemalloc.get_traced_memory()[0]
+        yield
+        test = self.runner.item_tests.get(item.nodeid) if hasattr(self.runner, 'item_tests') else None
+        instance_id = test['id'] if test else item.nodeid
+        growth = tracemalloc.get_traced_memory()[0] - size_before
+        self.instance_growth[instance_id] = self.instance_growth.get(instance_id, 0) + growth
+
+    def repetition_finished(self, tw, repetition):
+        if self.snapshot is None:
+            return
+        snapshot = self.take_snapshot()
+        statistics = snapshot.compare_to(self.snapshot, 'lineno')
+        self.snapshot = snapshot
+        total_growth = sum(statistic.size_diff for statistic in statistics)
+        tw.write("\nmemory growth during repetition {}: {} ({:.1f} KiB traced)\n"
+                 .format(repetition, format_size(total_growth), tracemalloc.get_traced_memory()[0] / 1024.0),
+                 bold=True)
+        instance_growth = sorted(self.instance_growth.items(), key=lambda growth: growth[1], reverse=True)
+        self.instance_growth = {}
+        for instance_id, growth in instance_growth[:TOP_ENTRIES]:
+            if growth > 0:
+                tw.write("    {}  {}\n".format(format_size(growth), instance_id))
+        for statistic in sorted(statistics, key=lambda statistic: statistic.size_diff, reverse=True)[:TOP_ENTRIES]:
+            if statistic.size_diff <= 0:
+                continue
+            frame = statistic.traceback[0]
+            owner = self.code_owner(frame.filename, frame.lineno)
+            tw.write("    {}  {}:{}{}\n".format(format_size(statistic.size_diff), frame.filename, frame.lineno,
+                                                ' ({})'.format(owner) if owner else ''))
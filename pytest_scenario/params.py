@@ -0,0 +1,81 @@
+__author__ = 'orim'
+from collections.abc import Mapping
+
+# one instance per distinct parameter set, shared by every scenario instance binding it
+_interned_params = {}
+
+
+class FixtureParams(Mapping):
+    # read-only params of a bound fixture (request.param), keys are reachable as attributes as well
+    __slots__ = ('_params', '_hash')
+
+    def __init__(self, params):
+        object.__setattr__(self, '_params', params)
+        object.__setattr__(self, '_hash', None)
+
+    def __getattr__(self, name):
+        if name in FixtureParams.__slots__:
+            raise AttributeError(name)
+        try:
+            return self._params[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("fixture params are read-only")
+
+    def __getitem__(self, key):
+        return self._params[key]
+
+    def __iter__(self):
+        return iter(self._params)
+
+    def __len__(self):
+        return len(self._params)
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash(frozenset(self._params.items())))
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, FixtureParams):
+            return self is other or self._params == other._params
+        return Mapping.__eq__(self, other)
+
+    def __repr__(self):
+        return 'FixtureParams({!r})'.format(self._params)
+
+    def __reduce__(self):
+        return intern_params, (dict(self._params),)
+
+
+def _types(value):
+    # 1, 1.0 and True are equal and hash alike, they should still not share an interned instance
+    if isinstance(value, FixtureParams):
+        return frozenset((key, _types(item)) for key, item in value.items())
+    if isinstance(value, tuple):
+        return tuple(_types(item) for item in value)
+    return type(value)
+
+
+def _freeze(value):
+    if isinstance(value, Mapping):
+        params = FixtureParams({key: _freeze(item) for key, item in value.items()})
+        try:
+            return _interned_params.setdefault((params, _types(params)), params)
+        except TypeError:
+            # holds a value that can not be hashed, still usable but not shared
+            return params
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def intern_params(params):
+    # params come as a mapping (scenario files) or as (name, value) pairs (test_case markers)
+    if params is None:
+        return None
+    if not isinstance(params, Mapping):
+        params = dict(params)
+    return _freeze(params)
@@ -1,31 +1,186 @@
 __author__ = "orim"
-import re
+import argparse
 import pytest
-import json
 import inspect
 import itertools
+import json
+import os
+import re
 import sys
-from attrdict import AttrDict
-from pyfiglet import figlet_format
+import time
 from pytest_scenario.exceptions import ImproperlyConfigured
+from pytest_scenario.fixture_cache import FixtureValueCache
 from os.path import abspath
 
+# this module is loaded by every pytest run through the pytest11 entry point, so anything that is only needed by a
+# specific feature (pyfiglet, the plan loader, worker processes, tracemalloc...) is imported where it is used
+
 
 TEST_SCENARIOS_DIR = './sut/scenarios'
+_END_OF_SCENARIO = object()
+_DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_duration(value):
+    parts = re.findall(r'(\d+(?:\.\d+)?)([smhd]?)', value)
+    if not parts or ''.join(number + unit for number, unit in parts) != value.replace(' ', ''):
+        raise argparse.ArgumentTypeError("invalid duration '{}' (e.g. 45s, 30m, 8h, 1h30m)".format(value))
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def parse_shard(value):
+    match = re.match(r'^(\d+)/(\d+)$', value.strip())
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError("invalid shard '{}' (e.g. 2/4 is the second of four shards)".format(value))
+    return int(match.group(1)), int(match.group(2))
+
+
+def parse_concurrency(value):
+    try:
+        concurrency = int(value)
+    except ValueError:
+        concurrency = 0
+    if concurrency < 1:
+        raise argparse.ArgumentTypeError("invalid concurrency '{}' (should be at least 1)".format(value))
+    return concurrency
+
 
 def pytest_addoption(parser):
     parser.addoption("--scenario", action="store", dest='scenario_name', metavar='name',
-                     help="states the scenario that should be tested")
-    parser.addoption("--repeat", action="store", default=1,
+                     help="states the scenario that should be tested, several comma separated scenarios are run "
+                          "one after the other in a single session")
+    parser.addoption("--repeat", action="store", default=None,
                      help="run all tests collected in a loop (default is 1 | infinite 0)")
+    parser.addoption("--repeat-duration", action="store", type=parse_duration, default=None, metavar='duration',
+                     help="keep repeating until the given wall-clock duration is over, e.g. 8h or 1h30m "
+                          "(no new test is started past the deadline)")
+    parser.addoption("--repeat-concurrency", action="store", type=int, default=1, metavar='K',
+                     help="run K repetitions at once, each in its own process")
+    parser.addoption("--repeat-slot", action="store", default=None, metavar='index/K',
+                     help="(internal) repetition slot of a concurrent repetition worker")
+    parser.addoption("--scenario-memory-tracking", action="store_true", default=False,
+                     help="trace memory allocations and report growth between repetitions, attributed to scenario "
+                          "instances, fixtures and tests")
+    parser.addoption("--scenario-banner", action="store", default='figlet', choices=('figlet', 'plain', 'none'),
+                     help="how the selected scenario is announced after collection (default is figlet)")
+    parser.addoption("--scenario-report", action="store", default='full', choices=('full', 'compact'),
+                     help="full prints a banner after every test, compact prints a progress line per scenario and "
+                          "sub-scenario instead (default is full)")
+    parser.addoption("--scenario-progress-interval", action="store", type=parse_duration, default=5.0,
+                     metavar='duration', help="how often compact reporting updates the progress line (default is 5s)")
+    parser.addoption("--scenario-cache-clear", action="store_true", default=False,
+                     help="discard the cached scenario plan and expand the scenario files again")
+    parser.addoption("--scenario-incremental", action="store_true", default=False,
+                     help="run only the scenario instances that changed, or did not pass, since they last ran")
+    parser.addoption("--scenario-failfirst", action="store_true", default=False,
+                     help="run scenario instances that failed last time first, then new or changed ones, cheapest "
+                          "first (serial sub-scenarios keep their order)")
+    parser.addoption("--scenario-fixture-schedule", action="store_true", default=False,
+                     help="reorder scenario instances so that those sharing bound fixtures run together "
+                          "(serial sub-scenarios keep their order)")
+    parser.addoption("--scenario-latency-report", action="store", default=None, metavar='path',
+                     help="write setup/call/teardown latency statistics of every scenario instance to a JSON file")
+    parser.addoption("--scenario-latency-budget", action="store_true", default=False,
+                     help="fail the run when a scenario instance exceeds the latency_budget of its record")
+    parser.addoption("--scenario-profile", action="store_true", default=False,
+                     help="report wall time and call counts of the plugin's plan building, collection and fixture "
+                          "binding phases per scenario and sub-scenario")
+    parser.addoption("--scenario-profile-dump", action="store", default=None, metavar='phase',
+                     choices=('plan', 'makeitem', 'generate_tests', 'modifyitems', 'binding'),
+                     help="with --scenario-profile, also write cProfile data of a phase to "
+                          "scenario-profile-<phase>.prof")
+    parser.addoption("--scenario-shard", action="store", type=parse_shard, default=None, metavar='i/N',
+                     help="run only the i-th of N shards of the scenario, balanced by instance count or by "
+                          "--scenario-durations")
+    parser.addoption("--scenario-durations", action="store", default=None, metavar='path',
+                     help="instance durations to balance shards with, the same copy of an earlier run's "
+                          ".cache/d/scenario/<name>.outcomes.json on every node")
+    parser.addoption("--scenario-validate", action="store_true", default=False,
+                     help="check the scenario, the scenarios it references and the test modules, classes, tests and "
+                          "fixtures they name without importing any test, report every error and exit")
+    parser.addoption("--scenario-concurrency", action="store", type=parse_concurrency, default=10, metavar='N',
+                     help="how many async instances of a concurrency group run at the same time (default is 10)")
+    parser.addoption("--scenario-workers", action="store", type=int, default=1, metavar='N',
+                     help="distribute scenario instances across N local worker processes")
+    parser.addoption("--scenario-worker-plan", action="store", default=None, metavar='path',
+                     help="(internal) JSON list of the scenario instances a worker process should run")
+    parser.addoption("--scenario-worker-results", action="store", default=None, metavar='path',
+                     help="(internal) file a worker process streams its test reports to")
+
+
+def pytest_addhooks(pluginmanager):
+    from pytest_scenario import hookspecs
+    pluginmanager.add_hookspecs(hookspecs)
+
+
+def pytest_cmdline_main(config):
+    if config.option.scenario_validate:
+        if not config.option.scenario_name:
+            raise pytest.UsageError("--scenario-validate needs a --scenario to validate")
+        from pytest_scenario.validation import validate
+        return validate(config)
 
 
 def pytest_configure(config):
+    if config.option.scenario_workers > 1 and config.option.repeat_concurrency > 1:
+        raise pytest.UsageError("--scenario-workers and --repeat-concurrency can not be combined")
+    if config.option.scenario_worker_results:
+        from pytest_scenario.workers import WorkerReporter
+        config.pluginmanager.register(WorkerReporter(config.option.scenario_worker_results),
+                                      name='scenario_worker_reporter')
     if config.pluginmanager.hasplugin('scenario') and config.option.scenario_name:
+        from pytest_scenario.cache import PlanCache
         scenario_name = config.option.scenario_name
-
-        config._scenario = TestScenarioRunner(scenario_name)
+        plan_cache = None
+        cache_dir = None
+        if getattr(config, 'cache', None) is not None:
+            cache_dir = str(config.cache.makedir('scenario'))
+            plan_cache = PlanCache(cache_dir)
+            if config.option.scenario_cache_clear:
+                plan_cache.clear(scenario_name)
+        elif config.option.scenario_incremental or config.option.scenario_failfirst:
+            raise pytest.UsageError("--scenario-incremental and --scenario-failfirst need pytest's cache provider")
+
+        worker_instances = None
+        if config.option.scenario_worker_plan:
+            with open(config.option.scenario_worker_plan) as worker_plan_file:
+                worker_instances = set(json.load(worker_plan_file))
+
+        profiler = None
+        if config.option.scenario_profile:
+            from pytest_scenario.profiling import PhaseProfiler
+            profiler = PhaseProfiler(config.option.scenario_profile_dump)
+            config.pluginmanager.register(profiler, name='scenario_profiler')
+        config._scenario = TestScenarioRunner(scenario_name, plan_cache, profiler=profiler,
+                                              fixture_schedule=config.option.scenario_fixture_schedule,
+                                              workers=config.option.scenario_workers,
+                                              worker_instances=worker_instances,
+                                              banner=config.option.scenario_banner,
+                                              concurrency=config.option.scenario_concurrency)
         config.pluginmanager.register(config._scenario, name=scenario_name)
+        if config.option.scenario_shard and worker_instances is None:
+            from pytest_scenario.incremental import load_durations
+            # every node has to weigh the plan the same way, a node's own history only covers the instances it ran
+            # itself, so shards are balanced by durations only when all the nodes are given the same file
+            durations_path = config.option.scenario_durations
+            if durations_path is not None and not os.path.isfile(durations_path):
+                raise pytest.UsageError("--scenario-durations file '{}' does not exist".format(durations_path))
+            config._scenario.shard = config.option.scenario_shard
+            config._scenario.durations = load_durations(durations_path) if durations_path else {}
+        if cache_dir is not None:
+            from pytest_scenario.incremental import IncrementalRun
+            # workers only select, outcomes are recorded by the process their reports are replayed in
+            config.pluginmanager.register(IncrementalRun(config._scenario, cache_dir,
+                                                         select_changed=config.option.scenario_incremental,
+                                                         failfirst=config.option.scenario_failfirst,
+                                                         record=not config.option.scenario_worker_results),
+                                          name='scenario_incremental_run')
+        if not config.option.scenario_worker_results and (config.option.scenario_latency_report or
+                                                          config.option.scenario_latency_budget):
+            from pytest_scenario.latency import LatencyRecorder
+            config.pluginmanager.register(LatencyRecorder(config._scenario, config.option.scenario_latency_report,
+                                                          config.option.scenario_latency_budget),
+                                          name='scenario_latency_recorder')
     else:
         # Register "test_case" markers.
         config_line = (
@@ -34,6 +189,15 @@ def pytest_configure(config):
         config.addinivalue_line('markers', config_line)
         config._scenario = TestCaseRunner()
         config.pluginmanager.register(config._scenario, name='test_case_runner')
+    config._scenario.report_mode = config.option.scenario_report
+    if config.option.scenario_report == 'compact' and not config.option.scenario_worker_results:
+        from pytest_scenario.progress import ProgressReporter
+        config.pluginmanager.register(ProgressReporter(config._scenario, config.option.scenario_progress_interval),
+                                      name='scenario_progress_reporter')
+    if config.option.scenario_memory_tracking and config.option.repeat_concurrency <= 1:
+        from pytest_scenario.memory import MemoryTracker
+        config._scenario.memory_tracker = MemoryTracker(config._scenario)
+        config.pluginmanager.register(config._scenario.memory_tracker, name='scenario_memory_tracker')
 
 
 def pytest_unconfigure(config):
@@ -43,78 +207,240 @@ def pytest_unconfigure(config):
         config.pluginmanager.unregister(scenario)
 
 
-class BaseRunner(object):
+@pytest.fixture
+def scenario_fixture_cache(request):
+    # lets a test invalidate bound fixture values, e.g. scenario_fixture_cache.invalidate('db_connection')
+    return request.config._scenario.fixture_cache
+
+
+class _ScenarioFrame(object):
+    # expansion state of a single scenario file while walking the @ref tree
+    __slots__ = ('scenario_name', 'parent_ref', 'test_instances', 'serial_group', 'depends_on', 'ref_id',
+                 'first_order', 'id_counter', 'sibling_orders')
+
+    def __init__(self, scenario_name, parent_ref, test_instances, serial_group=None, depends_on=(), ref_id=None,
+                 first_order=1):
+        self.scenario_name = scenario_name
+        self.parent_ref = parent_ref
+        self.test_instances = test_instances
+        self.serial_group = serial_group
+        self.depends_on = depends_on
+        self.ref_id = ref_id
+        self.first_order = first_order
+        self.id_counter = set()
+        # record id -> (first order, last order) of the instances it expanded into
+        self.sibling_orders = {}
 
-    test_arg_fixture_binding_dict = {}
-    item_setup_dict = {}
+
+class BaseRunner(object):
 
     def __init__(self):
         self.tw = None
+        # per session state, released once collection is over or once an item no longer needs it
+        self.test_arg_fixture_binding_dict = {}
+        self.fixture_bindings = {}
+        self.item_setup_dict = {}
+        self.fixture_defs_cache = {}
+        self.fixture_cache = FixtureValueCache()
+        self.repetition = None
+        self.memory_tracker = None
+        self.report_mode = 'full'
+        self.event_loop = None
 
     def pytest_generate_tests(self, metafunc):
         raise NotImplementedError()
 
+    def bind_fixture(self, instance_id, argname, func, scope, params):
+        # instances mostly bind the same few fixture configurations, so every distinct one is kept only once
+        from pytest_scenario.params import intern_params
+        fixture_config = (func, scope, intern_params(params))
+        try:
+            fixture_config = self.fixture_bindings.setdefault(fixture_config, fixture_config)
+        except TypeError:
+            pass
+        self.test_arg_fixture_binding_dict.setdefault(instance_id, {})[argname] = fixture_config
+
+    def get_fixture_defs(self, item, func):
+        # fixtures visible to an item are decided by the node it was collected under, so siblings share a closure
+        key = (func, item.parent.nodeid)
+        try:
+            return self.fixture_defs_cache[key]
+        except KeyError:
+            _, arg2fixturedefs = item.session._fixturemanager.getfixtureclosure([func], item)
+            fixture_defs = self.fixture_defs_cache[key] = arg2fixturedefs.get(func)
+            return fixture_defs
+
     def pytest_collection_modifyitems(self, config, items):
         for item in items:
+            if item.get_marker('skipif'):
+                continue
+            fully_qualified_name = '.'.join([item.module.__name__, item.cls.__name__, item.name])
             try:
-                if not item.get_marker('skipif'):
-                    fully_qualified_name = '.'.join([item.module.__name__, item.cls.__name__, item.name])
-                    fixture_binding_dict = self.test_arg_fixture_binding_dict[fully_qualified_name]
-                    for argname, fixture_config in fixture_binding_dict.items():
-                        func, _, fixture_params = fixture_config
-                        _, arg2fixturedefs = item.session._fixturemanager.getfixtureclosure([func], item)
-                        if fixture_params:
-                            item._request._pyfuncitem.callspec.params[func] = AttrDict(fixture_params)
-                        item._fixtureinfo.name2fixturedefs[func] = arg2fixturedefs[func]
-                        if argname in item.fixturenames:
-                            self.item_setup_dict[item.nodeid] = item
+                fixture_binding_dict = self.test_arg_fixture_binding_dict[fully_qualified_name]
             except KeyError:
-                pass
+                continue
+            fixture_bindings = []
+            for argname, fixture_config in fixture_binding_dict.items():
+                func, scope, fixture_params = fixture_config
+                fixture_defs = self.get_fixture_defs(item, func)
+                if fixture_defs is None:
+                    # reported once the test starts
+                    fixture_bindings.append((argname, func, scope, fixture_params, None))
+                    continue
+                if fixture_params:
+                    item._request._pyfuncitem.callspec.params[func] = fixture_params
+                item._fixtureinfo.name2fixturedefs[func] = fixture_defs
+                fixture_bindings.append((argname, func, scope, fixture_params, fixture_defs[0]))
+            if any(argname in item.fixturenames for argname in fixture_binding_dict):
+                self.item_setup_dict[item.nodeid] = (item, fixture_bindings)
+        # bindings now live next to the items that use them
+        self.test_arg_fixture_binding_dict.clear()
+        self.fixture_bindings.clear()
+        self.fixture_defs_cache.clear()
 
     def pytest_runtest_logstart(self, nodeid, location):
         try:
-            item = self.item_setup_dict[nodeid]
+            if self.repetition is None:
+                # runs once, nothing left to keep the item around for
+                item, fixture_bindings = self.item_setup_dict.pop(nodeid)
+            else:
+                item, fixture_bindings = self.item_setup_dict[nodeid]
         except KeyError:
             return
-        try:
-            fully_qualified_name = '.'.join([item.module.__name__, item.cls.__name__, item.name])
-            fixture_binding_dict = self.test_arg_fixture_binding_dict[fully_qualified_name]
-            for argname, fixture_config in fixture_binding_dict.items():
-                func, scope, _ = fixture_config
-                _, arg2fixturedefs = item.session._fixturemanager.getfixtureclosure([func], item)
-                fixture_def = arg2fixturedefs[func][0]
-                if scope and fixture_def.scope != scope:
-                    fixture_def.finish()
-                    fixture_def.scope = scope
-                try:
-                    if not item._request:
-                        item._initrequest()
-                    item.funcargs[argname] = item._request.getfuncargvalue(func)
-                except AttributeError as e:
-                    raise ImproperlyConfigured(', '.join([item.name, str(e)])) from e
-        except KeyError as e:
-            raise RuntimeError("unable to find a fixture function named {}".format(e))
+        for argname, func, scope, fixture_params, fixture_def in fixture_bindings:
+            if fixture_def is None:
+                raise RuntimeError("unable to find a fixture function named '{}'".format(func))
+            self.fixture_cache.prepare(func, fixture_def, scope, fixture_params or None)
+            try:
+                if not item._request:
+                    item._initrequest()
+                item.funcargs[argname] = item._request.getfuncargvalue(func)
+            except AttributeError as e:
+                raise ImproperlyConfigured(', '.join([item.name, str(e)])) from e
+            self.fixture_cache.stored(fixture_def)
 
     def pytest_collection_finish(self, session):
         self.tw = session.config.pluginmanager.getplugin('terminalreporter')._tw
 
     def pytest_runtestloop(self, session):
-        try:
-            repeat = int(session.config.option.repeat)
-        except AttributeError:
+        option = session.config.option
+        if option.collectonly:
             return
-        assert isinstance(repeat, int), "Repeat must be an integer"
+        deadline = None
+        repeat = option.repeat
+        if option.repeat_duration is not None:
+            deadline = time.time() + option.repeat_duration
+            if repeat is None:
+                repeat = 0
+        try:
+            repeat = int(repeat if repeat is not None else 1)
+        except ValueError:
+            raise pytest.UsageError("Repeat must be an integer")
+        if option.repeat_concurrency > 1:
+            return self.run_concurrent_repetitions(session, repeat, deadline)
+        if session.testsfailed and not getattr(option, 'continue_on_collection_errors', False):
+            raise session.Interrupted("%d errors during collection" % session.testsfailed)
+        slot, slots = 0, 1
+        if option.repeat_slot:
+            slot, slots = (int(value) for value in option.repeat_slot.split('/'))
+        if self.memory_tracker:
+            self.memory_tracker.start()
+        try:
+            self.run_repetitions(session, repeat, deadline, slot, slots)
+        finally:
+            if self.memory_tracker:
+                self.memory_tracker.stop()
+        return True
+
+    def run_repetitions(self, session, repeat, deadline, slot, slots):
         for i in itertools.count():
             if i == repeat and i != 0:
                 break
-            if repeat == 0:
+            if deadline is not None and time.time() >= deadline:
+                break
+            if repeat != 1 or slots != 1 or deadline is not None:
+                # global repetition number, unique across concurrent repetition workers
+                self.repetition = i * slots + slot + 1
+            if repeat == 0 and deadline is not None:
+                self.tw.write("repetition count: %d (until %s)\n"
+                              % (self.repetition, time.strftime('%H:%M:%S', time.localtime(deadline))), bold=True)
+            elif repeat == 0:
                 self.tw.write("repetition count: %d of %d\n" % (i+1, sys.maxsize), bold=True)
             elif repeat != 1:
                 self.tw.write("repetition count: %d of %d\n" % (i+1, repeat), bold=True)
-            session.config.pluginmanager.getplugin("main").pytest_runtestloop(session)
+            if not self.run_items(session, deadline):
+                self.tw.write("repeat duration is over, stopping\n", bold=True)
+                break
+            if self.memory_tracker:
+                self.memory_tracker.repetition_finished(self.tw, self.repetition or i+1)
+
+    def run_items(self, session, deadline=None):
+        # same as the main plugin loop, except that failed tests of a previous repetition are not taken for
+        # collection errors, and that no test is started once the deadline has passed
+        i = 0
+        while i < len(session.items):
+            if deadline is not None and time.time() >= deadline:
+                return False
+            # only the scenario runner runs instances together, plain test cases always run one by one
+            batch = self.concurrent_batch(session.items, i) if hasattr(self, 'concurrent_batch') else None
+            if batch:
+                i += len(batch)
+                nextitem = session.items[i] if i < len(session.items) else None
+                self.run_concurrently(batch, nextitem)
+            else:
+                item = session.items[i]
+                i += 1
+                nextitem = session.items[i] if i < len(session.items) else None
+                item.config.hook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+            if session.shouldstop:
+                raise session.Interrupted(session.shouldstop)
         return True
 
+    def run_concurrent_repetitions(self, session, repeat, deadline):
+        from pytest_scenario.workers import WorkerPool
+        concurrency = session.config.option.repeat_concurrency
+        pool = WorkerPool(session.config)
+        for slot in range(concurrency):
+            worker_repeat = len(range(slot, repeat, concurrency)) if repeat else 0
+            if repeat and not worker_repeat:
+                continue
+            worker_args = ['--repeat={}'.format(worker_repeat), '--repeat-concurrency=1',
+                           '--repeat-slot={}/{}'.format(slot, concurrency)]
+            if deadline is not None:
+                worker_args.append('--repeat-duration={}'.format(max(int(deadline - time.time()), 0)))
+            pool.add_worker(worker_args)
+        self.tw.write("running repetitions in {} concurrent processes\n".format(concurrency), bold=True)
+        return pool.run(session)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        outcome = yield
+        if self.repetition is not None:
+            report = outcome.get_result()
+            report.repetition = self.repetition
+            if report.failed:
+                report.sections.append(('repetition', str(self.repetition)))
+
+    def pytest_sessionfinish(self, session):
+        self.item_setup_dict.clear()
+        self.fixture_cache.clear()
+        if self.event_loop is not None:
+            self.event_loop.close()
+            self.event_loop = None
+
+    def pytest_fixture_post_finalizer(self, fixturedef):
+        self.fixture_cache.finalized(fixturedef)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        self.fixture_cache.report(terminalreporter)
+
+    def item_scenario(self, nodeid):
+        # the scenario or sub-scenario reference an item belongs to, None for a plain test case
+        return None
+
     def pytest_runtest_teardown(self, item, nextitem):
+        if self.report_mode == 'compact':
+            return
         self.tw.write('\n')
         self.tw.sep("=", "{} {}".format(item.name, 'skipped' if item.get_marker('skipif') else 'finished'))
         self.tw.write('\n')
@@ -155,11 +481,7 @@ class TestCaseRunner(BaseRunner):
                                 "missing '{}' key in while trying to bind a fixture to test param: "
                                 "(test_param, {func='your fixture', scope='function \ class \ module \ session'})"
                                 .format(e))
-                        try:
-                            self.test_arg_fixture_binding_dict[instance_id][argname] = (func, scope, params)
-                        except KeyError:
-                            self.test_arg_fixture_binding_dict[instance_id] = {}
-                            self.test_arg_fixture_binding_dict[instance_id][argname] = (func, scope, params)
+                        self.bind_fixture(instance_id, argname, func, scope, params)
                         if argname in metafunc.fixturenames:
                             values.insert(0, func)
                             if argname not in argnames:
@@ -178,62 +500,229 @@ class TestCaseRunner(BaseRunner):
 
 class TestScenarioRunner(BaseRunner):
 
-    def __init__(self, scenario_name: str):
+    def __init__(self, scenario_name: str, plan_cache: 'PlanCache'=None, fixture_schedule: bool=False,
+                 workers: int=1, worker_instances: set=None, banner: str='figlet', profiler: 'PhaseProfiler'=None,
+                 concurrency: int=10):
         BaseRunner.__init__(self)
         self._name = scenario_name
-        self.tests_dict, _ = self.generate_test_plan(scenario_name)
-
-    def generate_test_plan(self, scenario_name, parent_ref='', order=0):
+        # --scenario may name several scenarios separated by commas, they are merged into a single plan
+        self.scenario_names = [name.strip() for name in scenario_name.split(',') if name.strip()]
+        if len(set(self.scenario_names)) != len(self.scenario_names):
+            raise ImproperlyConfigured("a scenario is given more than once in '{}'".format(scenario_name))
+        self.banner = banner
+        self.fixture_schedule = fixture_schedule
+        self.workers = workers
+        self.concurrency = concurrency
+        self.concurrency_groups = False
+        self.worker_instances = worker_instances
+        self.item_tests = {}
+        self.fixture_switches = None
+        self.shard = None
+        self.durations = {}
+        self.shard_summary = None
+        self.tests_index = {}
+        self.scenario_files = set()
+        self.scenario_configs = {}
+        self.plan_cached = False
+        # modules the plan references, along with the packages holding them, and what collection skipped
+        self.plan_modules = None
+        self.package_names = {}
+        self.skipped_paths = 0
+        if profiler:
+            profiler.instrument(self)
+        self.tests_dict = self.build_plan(plan_cache)
+
+    def build_plan(self, plan_cache):
+        cached_tests = plan_cache.load(self._name) if plan_cache else None
+        self.plan_cached = cached_tests is not None
+        if not self.plan_cached:
+            tests_dict = self.generate_test_plan(self.scenario_names)
+            # parsed sub-scenarios are only reused while the plan is compiled
+            self.scenario_configs.clear()
+            if plan_cache:
+                plan_cache.store(self._name, self.scenario_files,
+                                 ((fully_qualified_name, instance_id, test_instance)
+                                  for fully_qualified_name, test_instances in self.tests_index.items()
+                                  for instance_id, test_instance in test_instances))
+            return tests_dict
         tests_dict = {}
-        scenario_file_path = '{}/{}.json'.format(TEST_SCENARIOS_DIR, scenario_name)
+        for fully_qualified_name, instance_id, test_instance in cached_tests:
+            tests_dict[instance_id] = test_instance
+            self.tests_index.setdefault(fully_qualified_name, []).append((instance_id, test_instance))
+        return tests_dict
+
+    def scenario_file_path(self, scenario_name):
+        from pytest_scenario.loader import SCENARIO_FILE_EXTENSIONS
+        for extension in SCENARIO_FILE_EXTENSIONS:
+            scenario_file_path = '{}/{}{}'.format(TEST_SCENARIOS_DIR, scenario_name, extension)
+            if os.path.isfile(scenario_file_path):
+                return scenario_file_path
+        raise RuntimeError("'{}' scenario is not defined (make sure {} is present)"
+                           .format(scenario_name, abspath('{}/{}.json'.format(TEST_SCENARIOS_DIR, scenario_name))))
+
+    def iter_scenario(self, scenario_name):
+        from pytest_scenario.loader import iter_scenario_records
+        scenario_file_path = self.scenario_file_path(scenario_name)
+        self.scenario_files.add(scenario_file_path)
+        return iter_scenario_records(scenario_file_path)
+
+    def load_scenario(self, scenario_name):
         try:
-            with open(scenario_file_path) as scenario_file:
-                scenario_config = json.load(scenario_file)
-        except FileNotFoundError:
-            raise RuntimeError("'{}' scenario is not defined (make sure {} is present)"
-                               .format(scenario_name, abspath(scenario_file_path)))
-        id_counter = set()
-        for test_instance in scenario_config:
+            return self.scenario_configs[scenario_name]
+        except KeyError:
+            pass
+        scenario_config = self.scenario_configs[scenario_name] = list(self.iter_scenario(scenario_name))
+        return scenario_config
+
+    def generate_test_plan(self, scenario_names):
+        from pytest_scenario.directives import expand_record, has_directives
+        tests_dict = {}
+        order = 0
+        # top level scenarios are merged one after the other (instance ids already start with the scenario name)
+        # and streamed, referenced sub-scenarios are parsed once and kept for reuse
+        stack = [_ScenarioFrame(scenario_name, '', None) for scenario_name in reversed(scenario_names)]
+        active_scenarios = set()
+        while stack:
+            if stack[-1].test_instances is None:
+                stack[-1].test_instances = self.iter_scenario(stack[-1].scenario_name)
+                active_scenarios = {stack[-1].scenario_name}
+            frame = stack[-1]
+            scenario_name = frame.scenario_name
+            test_instance = next(frame.test_instances, _END_OF_SCENARIO)
+            if test_instance is _END_OF_SCENARIO:
+                stack.pop()
+                active_scenarios.discard(scenario_name)
+                if frame.parent_ref and order >= frame.first_order:
+                    stack[-1].sibling_orders[frame.ref_id] = (frame.first_order, order)
+                continue
             assert "id" in test_instance,\
                 "test case record in scenario '{}' is missing an id field.".format(scenario_name)
-            test_id = '-'.join([scenario_name, str(test_instance["id"])])
-            if parent_ref:
-                test_id = '.'.join([parent_ref, test_id])
-            assert test_id not in id_counter,\
+            record_id = str(test_instance["id"])
+            test_id = '-'.join([scenario_name, record_id])
+            if frame.parent_ref:
+                test_id = '.'.join([frame.parent_ref, test_id])
+            assert test_id not in frame.id_counter,\
                 "found a duplicate test id {} in scenario '{}'".format(test_instance["id"], scenario_name)
-            id_counter.add(test_id)
-            if test_instance.get('@ref', None):
-                sub_scenario_tests, order = self.generate_test_plan(test_instance['@ref'], test_id, order)
-                tests_dict.update(sub_scenario_tests)
+            frame.id_counter.add(test_id)
+            depends_on = list(frame.depends_on)
+            for dependency in test_instance.get('depends_on', ()):
+                try:
+                    depends_on.append(frame.sibling_orders[str(dependency)])
+                except KeyError:
+                    raise ImproperlyConfigured("{} depends on '{}', which is not a preceding test id in scenario '{}'"
+                                               .format(test_id, dependency, scenario_name))
+            sub_scenario_name = test_instance.get('@ref', None)
+            if sub_scenario_name and has_directives(test_instance):
+                raise ImproperlyConfigured("{} can not both reference a scenario and be expanded with @matrix or @range"
+                                           .format(test_id))
+            if sub_scenario_name:
+                if sub_scenario_name in active_scenarios:
+                    ref_chain = [frame.scenario_name for frame in stack if frame.test_instances is not None]
+                    ref_chain = ref_chain[ref_chain.index(sub_scenario_name):] + [sub_scenario_name]
+                    raise ImproperlyConfigured("circular scenario reference in {}: {}"
+                                               .format(test_id, ' -> '.join(ref_chain)))
+                active_scenarios.add(sub_scenario_name)
+                serial_group = frame.serial_group
+                if serial_group is None and test_instance.get('serial', False):
+                    serial_group = test_id
+                stack.append(_ScenarioFrame(sub_scenario_name, test_id, iter(self.load_scenario(sub_scenario_name)),
+                                            serial_group, depends_on, ref_id=record_id,
+                                            first_order=order + 1))
             else:
                 assert "test_name" in test_instance,\
                     "test case record in scenario '{}' is missing a test_name field.".format(scenario_name)
-                test_instance["id"] = test_id
-                order += 1
-                test_instance["order"] = order
-                tests_dict.update({'%s.%s.%s[%s]' % (test_instance["module_name"],
+                if has_directives(test_instance):
+                    # expanded instances get ids derived from the record id, e.g. 'main scenario-3:0'
+                    expanded_instances = expand_record(test_instance)
+                else:
+                    expanded_instances = ((None, test_instance),)
+                first_order = order + 1
+                for index, test_instance in expanded_instances:
+                    # scenario files are parsed once, so every reference gets its own copy of the record
+                    test_instance = dict(test_instance)
+                    test_instance["id"] = test_id if index is None else '{}:{}'.format(test_id, index)
+                    order += 1
+                    test_instance["order"] = order
+                    # the scenario reference the instance was planned under, e.g. 'main scenario-3.teardown'
+                    test_instance["scenario"] = '.'.join([frame.parent_ref, scenario_name]) if frame.parent_ref \
+                        else scenario_name
+                    if frame.serial_group is not None:
+                        test_instance["serial_group"] = frame.serial_group
+                    if depends_on:
+                        test_instance["depends_on"] = depends_on
+                    else:
+                        test_instance.pop("depends_on", None)
+                    fully_qualified_name = '.'.join([test_instance["module_name"],
                                                      test_instance["class_name"],
-                                                     test_instance["test_name"],
-                                                     test_id): test_instance})
-        return tests_dict, order
+                                                     test_instance["test_name"]])
+                    instance_id = '%s[%s]' % (fully_qualified_name, test_instance["id"])
+                    tests_dict[instance_id] = test_instance
+                    self.tests_index.setdefault(fully_qualified_name, []).append((instance_id, test_instance))
+                frame.sibling_orders[record_id] = (first_order, order)
+        return tests_dict
+
+    def package_name(self, directory):
+        # the dotted name pytest imports a package directory under, None for a directory that is not a package
+        try:
+            return self.package_names[directory]
+        except KeyError:
+            pass
+        package_name = None
+        basename = os.path.basename(directory)
+        if basename.isidentifier() and os.path.isfile(os.path.join(directory, '__init__.py')):
+            parent_package_name = self.package_name(os.path.dirname(directory))
+            package_name = '.'.join([parent_package_name, basename]) if parent_package_name else basename
+        self.package_names[directory] = package_name
+        return package_name
+
+    def pytest_ignore_collect(self, path, config):
+        # files and packages the plan does not reference are skipped before they are imported, so collection grows
+        # with the scenario rather than with the test tree. explicitly given files are always collected
+        if self.plan_modules is None:
+            self.plan_modules = set()
+            for fully_qualified_name in self.tests_index:
+                module_name = fully_qualified_name.rsplit('.', 2)[0]
+                while module_name:
+                    self.plan_modules.add(module_name)
+                    module_name = module_name.rpartition('.')[0]
+        if path.check(dir=1):
+            module_name = self.package_name(str(path))
+        elif path.ext == '.py' and any(path.fnmatch(pattern) for pattern in config.getini('python_files')):
+            package_name = self.package_name(path.dirname)
+            module_name = path.purebasename
+            if package_name:
+                module_name = '.'.join([package_name, module_name])
+        else:
+            return None
+        if module_name is None or module_name in self.plan_modules:
+            return None
+        self.skipped_paths += 1
+        return True
+
+    def pytest_report_header(self, config):
+        if self.plan_cached:
+            return "scenario plan: '{}' loaded from cache".format(self._name)
+        return "scenario plan: '{}' compiled from {} scenario files".format(self._name, len(self.scenario_files))
 
     def pytest_pycollect_makeitem(self, collector, name, obj):
-        tests_dict = self.tests_dict
         if inspect.isfunction(obj) and name.startswith("test_") and isinstance(collector, pytest.Instance):
             fully_qualified_name = '.'.join([obj.__module__, obj.__qualname__])
-            for test_id in tests_dict.keys():
-                if fully_qualified_name == re.sub('\[.*?\]$', '', test_id):
-                    return
-            return []
+            if fully_qualified_name not in self.tests_index:
+                return []
 
     def pytest_collection_modifyitems(self, config, items):
         grouped_items = {}
+        item_tests = self.item_tests
+        deselected = []
         for item in items:
             fully_qualified_name = '.'.join([item.module.__name__, item.cls.__name__, item.name])
             try:
                 test = self.tests_dict[fully_qualified_name]
             except KeyError:
-                items.remove(item)
+                deselected.append(item)
+                continue
+            if self.worker_instances is not None and fully_qualified_name not in self.worker_instances:
+                deselected.append(item)
                 continue
             try:
                 if test['skip']:
@@ -247,19 +736,83 @@ class TestScenarioRunner(BaseRunner):
                     item.keywords['xfail'] = None
 
                 grouped_items.setdefault(test['order'], []).append(item)
+                item_tests[item.nodeid] = test
+                if 'concurrency_group' in test:
+                    self.concurrency_groups = True
             except KeyError as e:
                 raise ImproperlyConfigured('missing {} field in {} configuration'.format(e, item.name))
-        if grouped_items:
-            items[:] = self.order_items(grouped_items)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+        items[:] = self.order_items(grouped_items) or []
+        if self.fixture_schedule:
+            from pytest_scenario.scheduling import count_fixture_switches, group_by_fixtures
+            switches_before = count_fixture_switches(item_tests[item.nodeid] for item in items)
+            items[:] = group_by_fixtures(items, item_tests)
+            self.fixture_switches = (switches_before,
+                                     count_fixture_switches(item_tests[item.nodeid] for item in items))
+        if self.shard:
+            self.select_shard(config, items)
         BaseRunner.pytest_collection_modifyitems(self, config, items)
 
+    def select_shard(self, config, items):
+        # every shard partitions the whole plan the same way and keeps its own part, so shards have to agree on the
+        # durations (the same --scenario-durations file) to neither skip nor repeat an instance
+        from pytest_scenario.scheduling import partition, scheduling_units
+        shard_index, shards = self.shard
+        known_durations = [self.durations[item.nodeid] for item in items if item.nodeid in self.durations]
+        if known_durations:
+            default_duration = sum(known_durations) / len(known_durations)
+            weight = lambda unit: sum(self.durations.get(item.nodeid, default_duration) for item in unit)
+        else:
+            weight = len
+        assignment = partition(scheduling_units(items, self.item_tests), shards, weight)
+        selected = set(id(item) for unit in assignment[shard_index - 1] for item in unit)
+        deselected = [item for item in items if id(item) not in selected]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = [item for item in items if id(item) in selected]
+        expected_duration = sum(weight(unit) for unit in assignment[shard_index - 1]) if known_durations else None
+        self.shard_summary = (len(items), len(items) + len(deselected), expected_duration)
+
+    def pytest_runtestloop(self, session):
+        if self.workers > 1 and session.items and not session.config.option.collectonly:
+            from pytest_scenario.scheduling import partition, scheduling_units
+            from pytest_scenario.workers import WorkerPool
+            pool = WorkerPool(session.config)
+            for units in partition(scheduling_units(session.items, self.item_tests), self.workers):
+                if units:
+                    pool.add_worker(['--scenario-workers=1'],
+                                    ['.'.join([item.module.__name__, item.cls.__name__, item.name])
+                                     for unit in units for item in unit])
+            return pool.run(session)
+        return BaseRunner.pytest_runtestloop(self, session)
+
+    def item_scenario(self, nodeid):
+        test = self.item_tests.get(nodeid)
+        return test['scenario'] if test else None
+
+    def concurrent_batch(self, items, index):
+        # items from index on that should run together on the event loop
+        if not self.concurrency_groups:
+            return None
+        from pytest_scenario.concurrency import concurrent_batch
+        return concurrent_batch(items, index, self.item_tests)
+
+    def run_concurrently(self, batch, nextitem):
+        import asyncio
+        from pytest_scenario.concurrency import run_concurrently
+        if self.event_loop is None:
+            self.event_loop = asyncio.new_event_loop()
+        run_concurrently(batch, nextitem, self.event_loop, self.concurrency)
+
     def order_items(self, grouped_items):
         # Algorithm provided by https://github.com/ftobia
         if grouped_items:
             unordered_items = grouped_items.pop(None, None)
             sorted_items = []
             prev_key = 0
-            for key, ordered_items in grouped_items.items():
+            # positive orders first, then negative ones (e.g. -1 runs last)
+            for key, ordered_items in sorted(grouped_items.items(), key=lambda group: (group[0] < 0, group[0])):
                 if unordered_items and key < 0 <= prev_key:
                     sorted_items.extend(unordered_items)
                     unordered_items = None
@@ -271,20 +824,17 @@ class TestScenarioRunner(BaseRunner):
 
     def pytest_generate_tests(self, metafunc):
         fully_qualified_name = '.'.join([metafunc.module.__name__, metafunc.cls.__name__, metafunc.function.__name__])
-        test_instances = [test for test in self.tests_dict.items()
-                          if fully_qualified_name == re.sub('\[.*?\]$', '', test[0])]
+        test_instances = self.tests_index.get(fully_qualified_name)
+        if not test_instances:
+            return
         idlist = []
         argnames = []
         argvalues = []
         try:
             params = test_instances[0][1]['test_params'].items()
         except KeyError:
-            try:
-                source_el = 'scenario %s' % re.search('.*?\[(.*?)\]', test_instances[0][0]).group(1)
-            except AttributeError:
-                # should never happen
-                source_el = test_instances[0][0]
-            raise ImproperlyConfigured('missing \'test_params\' field in {} configuration'.format(source_el))
+            raise ImproperlyConfigured('missing \'test_params\' field in scenario {} configuration'
+                                       .format(test_instances[0][1]['id']))
         for argname, _ in params:
             if argname in metafunc.fixturenames:
                 argnames.append(argname)
@@ -303,11 +853,7 @@ class TestScenarioRunner(BaseRunner):
                     except KeyError as e:
                             raise ImproperlyConfigured(
                                 "missing {} key in {} fixture binding configuration".format(e, argname))
-                    try:
-                        self.test_arg_fixture_binding_dict[instance_id][argname] = (func, scope, params)
-                    except KeyError:
-                        self.test_arg_fixture_binding_dict[instance_id] = {}
-                        self.test_arg_fixture_binding_dict[instance_id][argname] = (func, scope, params)
+                    self.bind_fixture(instance_id, argname, func, scope, params)
                     if argname in metafunc.fixturenames:
                         values.insert(0, func)
                         if argname not in argnames:
@@ -324,5 +870,22 @@ class TestScenarioRunner(BaseRunner):
 
     def pytest_collection_finish(self, session):
         self.tw = session.config.pluginmanager.getplugin('terminalreporter')._tw
-        self.tw.write("selected scenario: \n", bold=True)
-        self.tw.write(figlet_format(self._name + '\n'), bold=True, blink=True)
+        if self.banner == 'figlet':
+            from pyfiglet import figlet_format
+            self.tw.write("selected scenario: \n", bold=True)
+            self.tw.write(figlet_format(self._name + '\n'), bold=True, blink=True)
+        elif self.banner == 'plain':
+            self.tw.write("selected scenario: {}\n".format(self._name), bold=True)
+        if self.shard_summary:
+            instances, total_instances, expected_duration = self.shard_summary
+            self.tw.write("scenario shard {}/{}: {} of {} instances, {}\n".format(
+                self.shard[0], self.shard[1], instances, total_instances,
+                'expected wall time {:.1f}s'.format(expected_duration) if expected_duration is not None
+                else 'balanced by instance count'), bold=True)
+        if self.skipped_paths:
+            self.tw.write("collection skipped {} modules and packages the scenario does not reference\n"
+                          .format(self.skipped_paths), bold=True)
+        if self.fixture_switches:
+            switches_before, switches_after = self.fixture_switches
+            self.tw.write("fixture scheduling: {} fixture value switches saved ({} -> {})\n"
+                          .format(switches_before - switches_after, switches_before, switches_after), bold=True)
@@ -0,0 +1,92 @@
+__author__ = 'orim'
+import functools
+import time
+
+PHASES = ('plan', 'makeitem', 'generate_tests', 'modifyitems', 'binding')
+
+
+def wraps_hook(method):
+    # functools.wraps for a wrapper replacing a hook method: pluggy matches hook arguments by name and does not follow
+    # __wrapped__, so the wrapper declares the wrapped method's arguments (without self) itself
+    def decorate(wrapper):
+        wrapper = functools.wraps(method)(wrapper)
+        wrapper._varnames = method.__code__.co_varnames[1:method.__code__.co_argcount]
+        return wrapper
+    return decorate
+
+
+class PhaseProfiler(object):
+    # wraps the runner's own hooks on the runner instance, so an unprofiled run does not pay anything for it.
+    # time is exclusive: a phase nested in another (sub-scenario parsing while building the plan) is only counted once
+
+    def __init__(self, dump_phase=None):
+        self.timings = {}
+        self.stack = []
+        self.dump_phase = dump_phase
+        self.dump_path = None
+        self.cprofile = None
+        if dump_phase:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+
+    def instrument(self, runner):
+        self.wrap(runner, 'build_plan', 'plan', lambda plan_cache: runner._name)
+        self.wrap(runner, 'load_scenario', 'plan', lambda scenario_name: scenario_name)
+        self.wrap(runner, 'pytest_pycollect_makeitem', 'makeitem', lambda collector, name, obj: runner._name)
+        self.wrap(runner, 'pytest_generate_tests', 'generate_tests', lambda metafunc: runner._name)
+        self.wrap(runner, 'pytest_collection_modifyitems', 'modifyitems', lambda config, items: runner._name)
+        self.wrap(runner, 'pytest_runtest_logstart', 'binding',
+                  lambda nodeid, location: runner.item_scenario(nodeid) or runner._name)
+
+    def wrap(self, runner, method_name, phase, scenario_of):
+        method = getattr(runner, method_name)
+
+        @wraps_hook(method)
+        def wrapper(*args, **kwargs):
+            self.enter(phase)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.exit(phase, scenario_of(*args, **kwargs))
+        setattr(runner, method_name, wrapper)
+
+    def enter(self, phase):
+        if self.cprofile and phase == self.dump_phase and phase not in (entry[0] for entry in self.stack):
+            self.cprofile.enable()
+        self.stack.append([phase, time.perf_counter(), 0.0])
+
+    def exit(self, phase, scenario):
+        _, started, nested = self.stack.pop()
+        elapsed = time.perf_counter() - started
+        if self.stack:
+            self.stack[-1][2] += elapsed
+        if self.cprofile and phase == self.dump_phase and phase not in (entry[0] for entry in self.stack):
+            self.cprofile.disable()
+        timing = self.timings.get((phase, scenario))
+        if timing is None:
+            timing = self.timings[(phase, scenario)] = [0, 0.0]
+        timing[0] += 1
+        timing[1] += elapsed - nested
+
+    def as_list(self):
+        return [{'phase': phase, 'scenario': scenario, 'calls': calls, 'seconds': seconds}
+                for (phase, scenario), (calls, seconds)
+                in sorted(self.timings.items(), key=lambda timing: (PHASES.index(timing[0][0]), timing[0][1]))]
+
+    def pytest_sessionfinish(self, session):
+        if self.cprofile:
+            self.dump_path = 'scenario-profile-{}.prof'.format(self.dump_phase)
+            self.cprofile.dump_stats(self.dump_path)
+        session.config.hook.pytest_scenario_profile(config=session.config, timings=self.as_list())
+
+    def pytest_terminal_summary(self, terminalreporter):
+        terminalreporter.write_sep("-", "scenario profile")
+        terminalreporter.write_line("{:<16}{:>10}{:>14}{:>14}  {}".format('phase', 'calls', 'total ms', 'mean us',
+                                                                          'scenario'))
+        for timing in self.as_list():
+            terminalreporter.write_line("{:<16}{:>10}{:>14.1f}{:>14.1f}  {}".format(
+                timing['phase'], timing['calls'], timing['seconds'] * 1000,
+                timing['seconds'] / timing['calls'] * 1e6, timing['scenario']))
+        if self.dump_path:
+            terminalreporter.write_line("cProfile data of the {} phase written to {}"
+                                        .format(self.dump_phase, self.dump_path))
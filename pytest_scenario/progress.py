@@ -0,0 +1,62 @@
+__author__ = 'orim'
+import time
+
+OUTCOMES = ('passed', 'failed', 'skipped', 'xfailed')
+
+
+class ProgressReporter(object):
+    # compact reporting: instead of a banner per test, a single progress line per scenario or sub-scenario is written
+    # every interval seconds and once it is over, failures are still reported in full by the terminal reporter
+
+    def __init__(self, runner, interval=5.0):
+        self.runner = runner
+        self.interval = interval
+        self.terminalreporter = None
+        self.group = None
+        self.counts = None
+        self.group_started = None
+        self.last_written = None
+        self.outcomes = {}
+
+    def pytest_sessionstart(self, session):
+        self.terminalreporter = session.config.pluginmanager.getplugin('terminalreporter')
+
+    def group_of(self, nodeid):
+        return self.runner.item_scenario(nodeid) or nodeid.rpartition('::')[0]
+
+    def pytest_runtest_logreport(self, report):
+        if report.failed:
+            self.outcomes[report.nodeid] = 'failed'
+        elif report.skipped and self.outcomes.get(report.nodeid) != 'failed':
+            self.outcomes[report.nodeid] = 'xfailed' if hasattr(report, 'wasxfail') else 'skipped'
+        if report.when != 'teardown':
+            return
+        outcome = self.outcomes.pop(report.nodeid, 'passed')
+        group = self.group_of(report.nodeid)
+        now = time.time()
+        if group != self.group:
+            self.write_progress(now)
+            self.group = group
+            self.counts = dict.fromkeys(OUTCOMES, 0)
+            self.group_started = self.last_written = now
+        self.counts[outcome] += 1
+        if now - self.last_written >= self.interval:
+            self.write_progress(now, finished=False)
+
+    def write_progress(self, now, finished=True):
+        if self.group is None or self.terminalreporter is None:
+            return
+        self.last_written = now
+        elapsed = now - self.group_started
+        total = sum(self.counts.values())
+        self.terminalreporter.write_line(
+            "{} {}: {} in {:.2f}s ({:.1f} tests/s)".format(
+                self.group, 'finished' if finished else 'running',
+                ', '.join('{} {}'.format(self.counts[outcome], outcome)
+                          for outcome in OUTCOMES if self.counts[outcome]),
+                elapsed, total / elapsed if elapsed > 0 else 0.0),
+            red=bool(self.counts['failed']), bold=True)
+
+    def pytest_sessionfinish(self, session):
+        self.write_progress(time.time())
+        self.group = None
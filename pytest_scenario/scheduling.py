@@ -0,0 +1,105 @@
+__author__ = 'orim'
+import heapq
+from collections import OrderedDict
+from pytest_scenario.params import intern_params
+
+
+def fixture_signature(test):
+    signature = []
+    for _, fixture_config in sorted(test.get('fixture_binding', {}).items()):
+        scope = fixture_config.get('scope', None)
+        if scope == 'function':
+            # set up again for every test no matter how instances are ordered
+            continue
+        signature.append((fixture_config.get('func', None), scope, intern_params(fixture_config.get('params', None))))
+    return tuple(signature)
+
+
+def count_fixture_switches(tests):
+    # mirrors the fixture value cache: a binding without params keeps the current value of its scope, one with params
+    # keeps it when it was set up with the same scope and params. every other binding switches the fixture to another
+    # value, set up or brought back, and the fixtures depending on it are set up again
+    current = {}
+    switches = 0
+    for test in tests:
+        for func, scope, params in fixture_signature(test):
+            if func in current and current[func][0] == scope and (params is None or current[func][1] == params):
+                continue
+            current[func] = (scope, params)
+            switches += 1
+    return switches
+
+
+def scheduling_units(items, item_tests):
+    # instances of a serial sub-scenario, of a concurrency group, or linked through depends_on, form a single unit
+    # that keeps its order. so does an instance binding a fixture without params with the nearest earlier instance
+    # binding it with the same scope, whose value it reuses
+    parents = {}
+
+    def find(order):
+        root = order
+        while parents[root] != root:
+            root = parents[root]
+        while parents[order] != root:
+            parents[order], order = root, parents[order]
+        return root
+
+    def union(order, other_order):
+        root, other_root = find(order), find(other_order)
+        if root != other_root:
+            parents[max(root, other_root)] = min(root, other_root)
+
+    for item in items:
+        order = item_tests[item.nodeid]['order']
+        parents[order] = order
+    serial_groups = {}
+    concurrency_groups = {}
+    dependency_roots = {}
+    for item in items:
+        test = item_tests[item.nodeid]
+        serial_group = test.get('serial_group', None)
+        if serial_group is not None:
+            union(serial_groups.setdefault(serial_group, test['order']), test['order'])
+        concurrency_group = test.get('concurrency_group', None)
+        if concurrency_group is not None:
+            union(concurrency_groups.setdefault(concurrency_group, test['order']), test['order'])
+        for first_order, last_order in test.get('depends_on', ()):
+            dependency = (first_order, last_order)
+            if dependency not in dependency_roots:
+                members = [order for order in range(first_order, last_order + 1) if order in parents]
+                for order in members[1:]:
+                    union(members[0], order)
+                dependency_roots[dependency] = members[0] if members else None
+            if dependency_roots[dependency] is not None:
+                union(dependency_roots[dependency], test['order'])
+    last_bindings = {}
+    for item in sorted(items, key=lambda item: item_tests[item.nodeid]['order']):
+        test = item_tests[item.nodeid]
+        for func, scope, params in fixture_signature(test):
+            if params is None and (func, scope) in last_bindings:
+                union(last_bindings[(func, scope)], test['order'])
+            last_bindings[(func, scope)] = test['order']
+    units = OrderedDict()
+    for item in items:
+        units.setdefault(find(item_tests[item.nodeid]['order']), []).append(item)
+    return list(units.values())
+
+
+def partition(units, partitions, weight=len):
+    # longest processing time first: every unit goes to the currently lightest partition
+    loads = [(0, index) for index in range(partitions)]
+    assignment = [[] for _ in range(partitions)]
+    for unit in sorted(units, key=weight, reverse=True):
+        load, index = heapq.heappop(loads)
+        assignment[index].append(unit)
+        heapq.heappush(loads, (load + weight(unit), index))
+    return assignment
+
+
+def group_by_fixtures(items, item_tests):
+    # stable grouping: units sharing a fixture signature are pulled up to the first unit that uses it. an instance
+    # binding a fixture without params is in the unit of the instance whose value it reuses, so it keeps that value
+    groups = OrderedDict()
+    for unit in scheduling_units(items, item_tests):
+        groups.setdefault(fixture_signature(item_tests[unit[0].nodeid]), []).append(unit)
+    return [item for units in groups.values() for unit in units for item in unit]
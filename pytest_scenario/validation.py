@@ -0,0 +1,334 @@
+__author__ = 'orim'
+import ast
+import os
+import sys
+import time
+from pytest_scenario.exceptions import ImproperlyConfigured
+
+# fields the runner reads from every test instance record
+REQUIRED_FIELDS = ('module_name', 'class_name', 'test_name', 'test_params', 'fixture_binding', 'skip', 'xfail')
+FIXTURE_DECORATORS = ('fixture', 'yield_fixture')
+FUNCTION_NODES = (ast.FunctionDef, getattr(ast, 'AsyncFunctionDef', ast.FunctionDef))
+
+
+def _decorated_fixture_name(function_node):
+    # the fixture name of a function decorated with @pytest.fixture, @fixture(...) or @pytest.yield_fixture, else None
+    for decorator in function_node.decorator_list:
+        call = decorator if isinstance(decorator, ast.Call) else None
+        target = call.func if call else decorator
+        name = target.attr if isinstance(target, ast.Attribute) else getattr(target, 'id', None)
+        if name not in FIXTURE_DECORATORS:
+            continue
+        for keyword in call.keywords if call else ():
+            if keyword.arg == 'name':
+                try:
+                    return ast.literal_eval(keyword.value)
+                except ValueError:
+                    pass
+        return function_node.name
+    return None
+
+
+def _argnames(function_node):
+    # the arguments pytest would fill in: without self and without the ones that have a default value
+    args = [arg.arg for arg in function_node.args.args[1:]]
+    if function_node.args.defaults:
+        args = args[:-len(function_node.args.defaults)]
+    return args + [arg.arg for arg, default in zip(function_node.args.kwonlyargs, function_node.args.kw_defaults)
+                   if default is None]
+
+
+def _parametrized_argnames(marks):
+    # the argnames of the pytest.mark.parametrize('a, b', ...) / mark.parametrize(['a', 'b'], ...) marks
+    argnames = set()
+    for decorator in marks:
+        if not isinstance(decorator, ast.Call) or not decorator.args or \
+                getattr(decorator.func, 'attr', getattr(decorator.func, 'id', None)) != 'parametrize':
+            continue
+        try:
+            names = ast.literal_eval(decorator.args[0])
+        except ValueError:
+            continue
+        if isinstance(names, str):
+            names = names.split(',')
+        argnames.update(name.strip() for name in names if isinstance(name, str))
+    return argnames
+
+
+class _Class(object):
+    __slots__ = ('bases', 'fixtures', 'methods', 'parametrized')
+
+    def __init__(self, node):
+        # the base class names, None for a base that is not a plain name (e.g. module.Base)
+        self.bases = [base.id if isinstance(base, ast.Name) else None for base in node.bases]
+        self.fixtures = set()
+        # test name -> argnames
+        self.methods = {}
+        # test name -> argnames provided by parametrize marks, the class' own marks under None
+        self.parametrized = {None: _parametrized_argnames(node.decorator_list)}
+        for class_node in node.body:
+            if isinstance(class_node, FUNCTION_NODES):
+                fixture_name = _decorated_fixture_name(class_node)
+                if fixture_name:
+                    self.fixtures.add(fixture_name)
+                self.methods[class_node.name] = _argnames(class_node)
+                self.parametrized[class_node.name] = _parametrized_argnames(class_node.decorator_list)
+
+
+class _Module(object):
+    __slots__ = ('path', 'fixtures', 'classes', 'parametrized')
+
+    def __init__(self, path, tree):
+        self.path = path
+        self.fixtures = set()
+        self.classes = {}
+        # argnames provided by a module level pytestmark = pytest.mark.parametrize(...)
+        self.parametrized = set()
+        for node in tree.body:
+            if isinstance(node, FUNCTION_NODES):
+                fixture_name = _decorated_fixture_name(node)
+                if fixture_name:
+                    self.fixtures.add(fixture_name)
+            elif isinstance(node, ast.ClassDef):
+                self.classes[node.name] = _Class(node)
+            elif isinstance(node, ast.Assign) and any(getattr(target, 'id', None) == 'pytestmark'
+                                                      for target in node.targets):
+                marks = node.value.elts if isinstance(node.value, (ast.List, ast.Tuple)) else [node.value]
+                self.parametrized.update(_parametrized_argnames(marks))
+
+    def lineage(self, class_name):
+        # the class and the base classes defined in this module, in lookup order, and whether every base was found
+        lineage, resolved, pending, seen = [], True, [class_name], {'object'}
+        while pending:
+            name = pending.pop(0)
+            if name in seen:
+                continue
+            seen.add(name)
+            if name not in self.classes:
+                resolved = False
+                continue
+            lineage.append(self.classes[name])
+            pending.extend(self.classes[name].bases)
+        return lineage, resolved
+
+
+class ScenarioValidator(object):
+    # checks a scenario, every scenario it references and the test modules its records name by parsing them, nothing
+    # is imported. fixtures are looked up in the test module, its conftest.py files and the registered plugins, so
+    # fixtures created at import time (e.g. in a loop) are not seen
+
+    def __init__(self, scenarios_dir, search_paths, rootdir, plugin_fixtures=()):
+        self.scenarios_dir = scenarios_dir
+        self.search_paths = search_paths
+        self.rootdir = os.path.abspath(rootdir)
+        self.plugin_fixtures = set(plugin_fixtures) | {'request'}
+        self.errors = []
+        self.reported = set()
+        self.validated_scenarios = set()
+        self.records = 0
+        self.modules = {}
+        self.conftest_fixtures = {}
+
+    def error(self, location, message):
+        if (location, message) not in self.reported:
+            self.reported.add((location, message))
+            self.errors.append('{}: {}'.format(location, message))
+
+    def scenario_file_path(self, scenario_name):
+        from pytest_scenario.loader import SCENARIO_FILE_EXTENSIONS
+        for extension in SCENARIO_FILE_EXTENSIONS:
+            scenario_file_path = os.path.join(self.scenarios_dir, scenario_name + extension)
+            if os.path.isfile(scenario_file_path):
+                return scenario_file_path
+        return None
+
+    def validate(self, scenario_names):
+        for scenario_name in scenario_names:
+            if self.scenario_file_path(scenario_name) is None:
+                self.error(self.scenarios_dir, "scenario '{}' is not defined".format(scenario_name))
+            else:
+                self.validate_scenario(scenario_name, [scenario_name])
+        return self.errors
+
+    def validate_scenario(self, scenario_name, ref_chain):
+        # every scenario file is checked once, however often it is referenced
+        from pytest_scenario.directives import expand_record, has_directives
+        from pytest_scenario.loader import iter_scenario_records
+        self.validated_scenarios.add(scenario_name)
+        scenario_file_path = self.scenario_file_path(scenario_name)
+        record_ids = set()
+        try:
+            for position, record in enumerate(iter_scenario_records(scenario_file_path), 1):
+                if 'id' not in record:
+                    self.error(scenario_file_path, "record #{} is missing an id field".format(position))
+                    continue
+                record_id = str(record['id'])
+                location = '{} record {}'.format(scenario_file_path, record_id)
+                if record_id in record_ids:
+                    self.error(location, "duplicate id")
+                for dependency in record.get('depends_on', ()):
+                    if str(dependency) not in record_ids:
+                        self.error(location, "depends on '{}', which is not a preceding id".format(dependency))
+                record_ids.add(record_id)
+                sub_scenario_name = record.get('@ref', None)
+                if sub_scenario_name:
+                    if has_directives(record):
+                        self.error(location, "can not both reference a scenario and be expanded with @matrix or "
+                                             "@range")
+                    if sub_scenario_name in ref_chain:
+                        self.error(location, "circular scenario reference: {}".format(
+                            ' -> '.join(ref_chain[ref_chain.index(sub_scenario_name):] + [sub_scenario_name])))
+                    elif self.scenario_file_path(sub_scenario_name) is None:
+                        self.error(location, "references scenario '{}', which is not defined".format(sub_scenario_name))
+                    elif sub_scenario_name not in self.validated_scenarios:
+                        self.validate_scenario(sub_scenario_name, ref_chain + [sub_scenario_name])
+                    continue
+                try:
+                    expanded_records = [record for _, record in expand_record(record)] if has_directives(record) \
+                        else [record]
+                except ImproperlyConfigured as e:
+                    self.error(location, str(e))
+                    continue
+                for expanded_record in expanded_records:
+                    self.records += 1
+                    self.validate_record(location, expanded_record)
+        except (ImproperlyConfigured, OSError) as e:
+            self.error(scenario_file_path, str(e))
+
+    def validate_record(self, location, record):
+        missing_fields = [field for field in REQUIRED_FIELDS if field not in record]
+        if missing_fields:
+            self.error(location, "missing {} field{}".format(', '.join("'%s'" % field for field in missing_fields),
+                                                              's' if len(missing_fields) > 1 else ''))
+        if 'latency_budget' in record:
+            from pytest_scenario.latency import budget_errors
+            for error in budget_errors(record['latency_budget']):
+                self.error(location, error)
+        if any(field in missing_fields for field in ('module_name', 'class_name', 'test_name')):
+            return
+        module_name, class_name, test_name = record['module_name'], record['class_name'], record['test_name']
+        module = self.module(module_name)
+        if module is None:
+            self.error(location, "module '{}' not found".format(module_name))
+            return
+        if class_name not in module.classes:
+            self.error(location, "class '{}' not found in {}".format(class_name, module.path))
+            return
+        lineage, resolved = module.lineage(class_name)
+        cls = next((cls for cls in lineage if test_name in cls.methods), None)
+        if cls is None:
+            # a base class defined elsewhere can not be checked without importing it, so neither can the tests and
+            # fixtures it may provide
+            if resolved:
+                self.error(location, "test '{}' not found in {}.{}".format(test_name, module_name, class_name))
+            return
+        argnames = cls.methods[test_name]
+        parametrized = set(cls.parametrized[test_name]) | module.parametrized
+        for base in lineage:
+            parametrized |= base.parametrized[None]
+        fully_qualified_name = '.'.join([module_name, class_name, test_name])
+        known_fixtures = set().union(*[base.fixtures for base in lineage]) | module.fixtures | \
+            self.fixtures_around(module.path) | self.plugin_fixtures
+        test_params = record.get('test_params', {})
+        fixture_binding = record.get('fixture_binding', {})
+        if not isinstance(test_params, dict):
+            self.error(location, "'test_params' should map argument names to values")
+            test_params = {}
+        if not isinstance(fixture_binding, dict):
+            self.error(location, "'fixture_binding' should map argument names to fixture configurations")
+            fixture_binding = {}
+        for argname in test_params:
+            if argname not in argnames:
+                self.error(location, "'{}' is not a valid argument for {}".format(argname, fully_qualified_name))
+        for argname, fixture_config in fixture_binding.items():
+            if argname not in argnames:
+                self.error(location, "'{}' is not a valid argument for {}".format(argname, fully_qualified_name))
+            if not isinstance(fixture_config, dict) or 'func' not in fixture_config:
+                self.error(location, "missing 'func' key in {} fixture binding configuration".format(argname))
+            elif resolved and fixture_config['func'] not in known_fixtures:
+                self.error(location, "fixture '{}' bound to {} not found".format(fixture_config['func'], argname))
+        for argname in argnames:
+            if argname in test_params or argname in fixture_binding or argname in parametrized:
+                continue
+            if resolved and argname not in known_fixtures:
+                self.error(location, "fixture '{}' of {} not found".format(argname, fully_qualified_name))
+
+    def module(self, module_name):
+        try:
+            return self.modules[module_name]
+        except KeyError:
+            pass
+        module = None
+        relative_path = os.path.join(*module_name.split('.'))
+        for search_path in self.search_paths:
+            for path in (relative_path + '.py', os.path.join(relative_path, '__init__.py')):
+                path = os.path.join(search_path, path)
+                if os.path.isfile(path):
+                    module = _Module(path, self.parse(path))
+                    break
+            if module is not None:
+                break
+        self.modules[module_name] = module
+        return module
+
+    def parse(self, path):
+        try:
+            with open(path, 'rb') as source_file:
+                return ast.parse(source_file.read(), path)
+        except SyntaxError as e:
+            self.error(path, "invalid syntax at line {}".format(e.lineno))
+            return ast.Module(body=[])
+        except (OSError, ValueError) as e:
+            self.error(path, str(e))
+            return ast.Module(body=[])
+
+    def fixtures_around(self, module_path):
+        # fixtures of the conftest.py files in the module's directory and its parents, up to the rootdir
+        directory = os.path.dirname(os.path.abspath(module_path))
+        fixtures = set()
+        while True:
+            try:
+                fixtures |= self.conftest_fixtures[directory]
+            except KeyError:
+                conftest_path = os.path.join(directory, 'conftest.py')
+                conftest_fixtures = self.conftest_fixtures[directory] = set()
+                if os.path.isfile(conftest_path):
+                    conftest_fixtures.update(_Module(conftest_path, self.parse(conftest_path)).fixtures)
+                fixtures |= conftest_fixtures
+            parent = os.path.dirname(directory)
+            if directory == self.rootdir or parent == directory:
+                return fixtures
+            directory = parent
+
+
+def plugin_fixtures(pluginmanager):
+    # fixtures of plugins that are already registered (pytest's own ones among them), nothing new gets imported
+    names = set()
+    for plugin in pluginmanager.get_plugins():
+        for name in dir(plugin):
+            try:
+                marker = getattr(getattr(plugin, name), '_pytestfixturefunction', None)
+            except Exception:
+                continue
+            if marker is not None and getattr(marker, 'scope', None) is not None:
+                names.add(getattr(marker, 'name', None) or name)
+    return names
+
+
+def validate(config):
+    from _pytest.config import create_terminal_writer
+    from pytest_scenario.plugin import TEST_SCENARIOS_DIR
+    started = time.time()
+    scenario_names = [name.strip() for name in config.option.scenario_name.split(',') if name.strip()]
+    search_paths = [str(config.rootdir), os.getcwd()] + [path for path in sys.path if path]
+    validator = ScenarioValidator(TEST_SCENARIOS_DIR, search_paths, str(config.rootdir),
+                                  plugin_fixtures(config.pluginmanager))
+    errors = validator.validate(scenario_names)
+    tw = create_terminal_writer(config)
+    for error in errors:
+        tw.line(error, red=True)
+    modules = len([module for module in validator.modules.values() if module])
+    tw.line("scenario validation: {} records in {} scenario files, {} modules, {} error{} in {:.2f} seconds".format(
+        validator.records, len(validator.validated_scenarios), modules, len(errors), '' if len(errors) == 1 else 's',
+        time.time() - started), bold=True, red=bool(errors), green=not errors)
+    return 1 if errors else 0
@@ -0,0 +1,128 @@
+__author__ = 'orim'
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from _pytest.runner import TestReport
+
+POLL_INTERVAL = 0.1
+# exit codes of a worker that ran to completion: ok, tests failed, interrupted, no tests collected
+WORKER_EXIT_CODES = (0, 1, 2, 5)
+
+
+def serialize_report(report):
+    longrepr = report.longrepr
+    if longrepr is not None and not isinstance(longrepr, tuple):
+        longrepr = str(longrepr)
+    serialized_report = {
+        'nodeid': report.nodeid,
+        'location': report.location,
+        'keywords': {keyword: 1 for keyword in report.keywords},
+        'outcome': report.outcome,
+        'longrepr': longrepr,
+        'when': report.when,
+        'sections': report.sections,
+        'duration': report.duration,
+    }
+    for attribute in ('wasxfail', 'repetition'):
+        if hasattr(report, attribute):
+            serialized_report[attribute] = getattr(report, attribute)
+    return serialized_report
+
+
+def deserialize_report(serialized_report):
+    if isinstance(serialized_report['longrepr'], list):
+        serialized_report['longrepr'] = tuple(serialized_report['longrepr'])
+    serialized_report['location'] = tuple(serialized_report['location'])
+    serialized_report['sections'] = [tuple(section) for section in serialized_report['sections']]
+    return TestReport(**serialized_report)
+
+
+class WorkerReporter(object):
+    # registered inside a worker process, streams every test report back to the pool as a JSON line
+
+    def __init__(self, results_path):
+        self.results_file = open(results_path, 'a')
+
+    def pytest_runtest_logreport(self, report):
+        self.results_file.write(json.dumps(serialize_report(report)) + '\n')
+        self.results_file.flush()
+
+    def pytest_unconfigure(self, config):
+        self.results_file.close()
+
+
+class _Worker(object):
+
+    def __init__(self, index, process, results_file, log_path):
+        self.index = index
+        self.process = process
+        self.results_file = results_file
+        self.log_path = log_path
+        self.pending = ''
+
+
+class WorkerPool(object):
+    # every worker re-runs the original command line with its own extra arguments appended
+
+    def __init__(self, config):
+        self.config = config
+        self.worker_args = []
+
+    def add_worker(self, extra_args, instance_ids=None):
+        self.worker_args.append((list(extra_args), instance_ids))
+
+    def run(self, session):
+        work_dir = tempfile.mkdtemp(prefix='pytest-scenario-')
+        workers = []
+        try:
+            for index, (extra_args, instance_ids) in enumerate(self.worker_args):
+                results_path = os.path.join(work_dir, 'worker-{}.results.jsonl'.format(index))
+                log_path = os.path.join(work_dir, 'worker-{}.log'.format(index))
+                # the cached plan was already cleared by this process, workers only read it
+                args = [sys.executable, '-m', 'pytest'] + [str(arg) for arg in self.config._origargs
+                                                           if str(arg) != '--scenario-cache-clear'] + extra_args
+                args.append('--scenario-worker-results={}'.format(results_path))
+                if instance_ids is not None:
+                    plan_path = os.path.join(work_dir, 'worker-{}.plan.json'.format(index))
+                    with open(plan_path, 'w') as plan_file:
+                        json.dump(instance_ids, plan_file)
+                    args.append('--scenario-worker-plan={}'.format(plan_path))
+                open(results_path, 'w').close()
+                with open(log_path, 'w') as log_file:
+                    process = subprocess.Popen(args, stdout=log_file, stderr=subprocess.STDOUT)
+                workers.append(_Worker(index, process, open(results_path), log_path))
+            running = list(workers)
+            while running:
+                for worker in workers:
+                    self.collect_reports(worker)
+                if session.shouldstop:
+                    for worker in running:
+                        worker.process.terminate()
+                running = [worker for worker in running if worker.process.poll() is None]
+                time.sleep(POLL_INTERVAL)
+            for worker in workers:
+                self.collect_reports(worker)
+                worker.results_file.close()
+                if worker.process.returncode not in WORKER_EXIT_CODES and not session.shouldstop:
+                    with open(worker.log_path) as log_file:
+                        raise RuntimeError("scenario worker {} exited with code {}:\n{}"
+                                           .format(worker.index, worker.process.returncode, log_file.read()))
+        finally:
+            for worker in workers:
+                if worker.process.poll() is None:
+                    worker.process.kill()
+                    worker.process.wait()
+                worker.results_file.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return True
+
+    def collect_reports(self, worker):
+        worker.pending += worker.results_file.read()
+        *lines, worker.pending = worker.pending.split('\n')
+        for line in lines:
+            report = deserialize_report(json.loads(line))
+            self.config.hook.pytest_runtest_logreport(report=report)
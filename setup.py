@@ -9,7 +9,7 @@ setup(name='pytest-scenario',
       download_url='https://github.com/OriMenashe/pytest-scenario/tarball/1.0a5',
       packages=['pytest_scenario'],
       entry_points={'pytest11': ['scenario = pytest_scenario.plugin']},
-      install_requires=['pytest>=2.3', 'pyfiglet==0.7.5', 'attrdict'],
+      install_requires=['pytest>=2.3', 'pyfiglet==0.7.5'],
       license='WTFPL',
       keywords=['testing', 'py.test', 'pytest', 'scenario'],
       classifiers=[
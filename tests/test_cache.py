@@ -0,0 +1,99 @@
+__author__ = 'orim'
+import json
+import os
+import pytest
+from pytest_scenario import cache
+
+pytest_plugins = 'pytester'
+
+TESTS = [['tests.sample.TestSample.test_sample', 'main-1', {'id': 'main-1', 'order': 0}],
+         ['tests.sample.TestSample.test_sample', 'main-2', {'id': 'main-2', 'order': 1}]]
+
+TEST_MODULE = '''
+class TestSample:
+
+    def test_sample(self, test_param):
+        assert test_param
+'''
+
+
+def record(record_id, test_param):
+    return {'id': record_id, 'module_name': 'test_sample', 'class_name': 'TestSample', 'test_name': 'test_sample',
+            'test_params': {'test_param': test_param}, 'fixture_binding': {}, 'skip': False, 'xfail': False}
+
+
+class TestPlanCache:
+
+    @pytest.fixture
+    def scenario_file(self, tmpdir):
+        scenario_file = tmpdir.join('main.json')
+        scenario_file.write('[]')
+        return scenario_file
+
+    @pytest.fixture
+    def plan_cache(self, tmpdir):
+        return cache.PlanCache(str(tmpdir.mkdir('cache')))
+
+    def test_plan_is_reused(self, plan_cache, scenario_file):
+        assert plan_cache.load('main') is None
+        plan_cache.store('main', [str(scenario_file)], iter(TESTS))
+        assert list(plan_cache.load('main')) == TESTS
+        assert list(plan_cache.load('main')) == TESTS
+
+    def test_modified_file_invalidates_the_plan(self, plan_cache, scenario_file):
+        plan_cache.store('main', [str(scenario_file)], TESTS)
+        stat = os.stat(str(scenario_file))
+        os.utime(str(scenario_file), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        assert plan_cache.load('main') is None
+
+    def test_resized_file_invalidates_the_plan(self, plan_cache, scenario_file):
+        plan_cache.store('main', [str(scenario_file)], TESTS)
+        stat = os.stat(str(scenario_file))
+        scenario_file.write('[ ]')
+        # the same mtime, only the size tells the file changed
+        os.utime(str(scenario_file), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert plan_cache.load('main') is None
+
+    def test_removed_file_invalidates_the_plan(self, plan_cache, scenario_file):
+        plan_cache.store('main', [str(scenario_file)], TESTS)
+        scenario_file.remove()
+        assert plan_cache.load('main') is None
+
+    def test_other_version_invalidates_the_plan(self, plan_cache, scenario_file, monkeypatch):
+        plan_cache.store('main', [str(scenario_file)], TESTS)
+        monkeypatch.setattr(cache, 'PLAN_CACHE_VERSION', cache.PLAN_CACHE_VERSION + 1)
+        assert plan_cache.load('main') is None
+
+    def test_corrupt_plan_is_ignored(self, plan_cache):
+        with open(plan_cache._plan_path('main'), 'w') as plan_file:
+            plan_file.write('not json\n')
+        assert plan_cache.load('main') is None
+
+    def test_clear(self, plan_cache, scenario_file):
+        plan_cache.store('main', [str(scenario_file)], TESTS)
+        plan_cache.store('other', [str(scenario_file)], TESTS)
+        plan_cache.clear('main')
+        plan_cache.clear('missing')
+        assert plan_cache.load('main') is None
+        assert list(plan_cache.load('other')) == TESTS
+
+    def test_scenario_names_with_sub_directories(self, plan_cache, scenario_file):
+        plan_cache.store('nightly/main', [str(scenario_file)], TESTS)
+        assert os.listdir(plan_cache.cache_dir) == [cache.cache_file_name('nightly/main', '.plan.jsonl')]
+        assert list(plan_cache.load('nightly/main')) == TESTS
+
+    def test_scenario_run(self, testdir):
+        testdir.makepyfile(test_sample=TEST_MODULE)
+        scenario_file = testdir.mkdir('sut').mkdir('scenarios').join('smoke.json')
+        scenario_file.write(json.dumps([record(1, 'a'), record(2, 'b')]))
+        result = testdir.runpytest_subprocess('-v', '--scenario=smoke')
+        result.stdout.fnmatch_lines(["scenario plan: 'smoke' compiled from 1 scenario files", '*2 passed*'])
+        result = testdir.runpytest_subprocess('-v', '--scenario=smoke')
+        result.stdout.fnmatch_lines(["scenario plan: 'smoke' loaded from cache", '*2 passed*'])
+        result = testdir.runpytest_subprocess('-v', '--scenario=smoke', '--scenario-cache-clear')
+        result.stdout.fnmatch_lines(["scenario plan: 'smoke' compiled from 1 scenario files", '*2 passed*'])
+        # a changed scenario file is expanded again
+        scenario_file.write(json.dumps([record(1, 'a'), record(2, 'b'), record(3, 'c')]))
+        result = testdir.runpytest_subprocess('-v', '--scenario=smoke')
+        result.stdout.fnmatch_lines(["scenario plan: 'smoke' compiled from 1 scenario files",
+                                     '*test_sample?smoke-3? PASSED', '*3 passed*'])
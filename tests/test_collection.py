@@ -0,0 +1,86 @@
+__author__ = 'orim'
+import json
+import pytest
+from pytest_scenario import plugin
+
+pytest_plugins = 'pytester'
+
+TEST_MODULE = '''
+class TestSample:
+
+    def test_sample(self, test_param):
+        assert test_param
+'''
+
+# a module the scenario does not reference, importing it fails the run
+UNREFERENCED_MODULE = '''
+raise RuntimeError('unreferenced module imported')
+'''
+
+
+def record(record_id, module_name):
+    return {'id': record_id, 'module_name': module_name, 'class_name': 'TestSample', 'test_name': 'test_sample',
+            'test_params': {'test_param': 'a'}, 'fixture_binding': {}, 'skip': False, 'xfail': False}
+
+
+class _Config(object):
+
+    def getini(self, name):
+        assert name == 'python_files'
+        return ['test_*.py', '*_test.py']
+
+
+class TestIgnoreCollect:
+
+    @pytest.fixture
+    def tree(self, tmpdir, monkeypatch):
+        # tests/ and tests/api/ are packages, tests/api/v1/ and tests/data/ are not and no-package/ is not an identifier
+        for directory in ['tests', 'tests/api', 'tests/api/v1', 'tests/data', 'tests/web', 'no-package']:
+            tmpdir.ensure(directory, dir=True)
+        for package in ['tests', 'tests/api', 'tests/web', 'no-package']:
+            tmpdir.ensure(package, '__init__.py')
+        tmpdir.ensure('sut', 'scenarios', dir=True).join('main.json').write(json.dumps(
+            [record(1, 'tests.api.test_users'), record(2, 'test_top')]))
+        monkeypatch.chdir(tmpdir)
+        return tmpdir
+
+    @pytest.fixture
+    def runner(self, tree):
+        return plugin.TestScenarioRunner('main')
+
+    def test_package_name(self, tree, runner):
+        assert runner.package_name(str(tree.join('tests'))) == 'tests'
+        assert runner.package_name(str(tree.join('tests', 'api'))) == 'tests.api'
+        assert runner.package_name(str(tree.join('tests', 'api', 'v1'))) is None
+        assert runner.package_name(str(tree.join('tests', 'data'))) is None
+        assert runner.package_name(str(tree.join('no-package'))) is None
+        assert runner.package_names[str(tree.join('tests', 'api'))] == 'tests.api'
+
+    def test_referenced_paths_are_collected(self, tree, runner):
+        config = _Config()
+        for path in [tree.join('tests'), tree.join('tests', 'api'), tree.join('tests', 'api', 'test_users.py'),
+                     tree.join('test_top.py'), tree.join('tests', 'data'), tree.join('tests', 'api', 'conftest.py'),
+                     tree.join('tests', 'api', 'helpers.py')]:
+            assert runner.pytest_ignore_collect(path, config) is None, path
+        assert runner.skipped_paths == 0
+
+    def test_unreferenced_paths_are_skipped(self, tree, runner):
+        config = _Config()
+        for path in [tree.join('tests', 'web'), tree.join('tests', 'api', 'test_groups.py'),
+                     tree.join('tests', 'api', 'users_test.py'), tree.join('test_other.py'),
+                     tree.join('tests', 'data', 'test_users.py')]:
+            assert runner.pytest_ignore_collect(path, config) is True, path
+        assert runner.skipped_paths == 5
+
+    def test_scenario_run(self, testdir):
+        testdir.makepyfile(test_sample=TEST_MODULE, test_other=UNREFERENCED_MODULE)
+        testdir.mkdir('sut').mkdir('scenarios').join('smoke.json').write(json.dumps([record(1, 'test_sample')]))
+        result = testdir.runpytest_subprocess('-p', 'no:cacheprovider', '--scenario=smoke')
+        result.stdout.fnmatch_lines(['collection skipped 1 modules and packages the scenario does not reference',
+                                     '*1 passed*'])
+        assert result.ret == 0
+        # a file given on the command line is collected though the scenario does not reference it
+        result = testdir.runpytest_subprocess('-p', 'no:cacheprovider', '--scenario=smoke', 'test_sample.py',
+                                              'test_other.py')
+        result.stdout.fnmatch_lines(['*unreferenced module imported*'])
+        assert result.ret != 0
@@ -0,0 +1,67 @@
+__author__ = 'orim'
+import json
+import pytest
+
+pytest_plugins = 'pytester'
+
+TEST_MODULE = '''
+import asyncio
+import time
+import pytest
+
+STARTED = []
+STOPPED = []
+TOKENS = []
+
+
+@pytest.fixture
+def token():
+    return object()
+
+
+class TestAsync:
+
+    async def test_wait(self, token, test_param):
+        STARTED.append(time.time())
+        TOKENS.append(id(token))
+        await asyncio.sleep(0.3)
+        STOPPED.append(time.time())
+        assert test_param != 'bad'
+
+    def test_check(self, test_param):
+        # every instance started before the first one was over, each with a function scoped value of its own
+        assert len(STARTED) == 3 and max(STARTED) < min(STOPPED)
+        assert len(set(TOKENS)) == 3
+'''
+
+
+def record(record_id, test_name, test_param, **fields):
+    record = {'id': record_id, 'module_name': 'test_async', 'class_name': 'TestAsync', 'test_name': test_name,
+              'test_params': {'test_param': test_param}, 'fixture_binding': {}, 'skip': False, 'xfail': False}
+    record.update(fields)
+    return record
+
+
+class TestConcurrency:
+
+    def test_concurrency_group(self, testdir):
+        testdir.makepyfile(test_async=TEST_MODULE)
+        testdir.mkdir('sut').mkdir('scenarios').join('async.json').write(json.dumps(
+            [record(1, 'test_wait', 'a', concurrency_group='g'), record(2, 'test_wait', 'bad', concurrency_group='g'),
+             record(3, 'test_wait', 'c', concurrency_group='g'), record(4, 'test_check', 'x')]))
+        result = testdir.runpytest_subprocess('-v', '-p', 'no:cacheprovider', '--scenario=async')
+        result.stdout.fnmatch_lines([
+            '*test_wait?async-1? PASSED',
+            '*test_wait?async-2? FAILED',
+            '*test_wait?async-3? PASSED',
+            '*test_check?async-4? PASSED',
+            "*assert 'bad' != 'bad'",
+            '*1 failed, 3 passed*',
+        ])
+        assert result.ret == 1
+
+    @pytest.mark.parametrize('concurrency', ['0', 'many'])
+    def test_invalid_concurrency(self, testdir, concurrency):
+        result = testdir.runpytest_subprocess('--scenario-concurrency', concurrency)
+        result.stderr.fnmatch_lines(["*invalid concurrency '{}'*".format(concurrency)])
+        assert result.ret != 0
@@ -0,0 +1,60 @@
+__author__ = 'orim'
+import pytest
+from pytest_scenario.directives import expand_record, has_directives
+from pytest_scenario.exceptions import ImproperlyConfigured
+
+
+class TestDirectives:
+
+    def test_has_directives(self):
+        assert has_directives({'id': 1, '@range': [2]})
+        assert has_directives({'id': 1, '@matrix': {}})
+        assert not has_directives({'id': 1, 'test_params': {'@range': [2]}})
+
+    def test_range_copies(self):
+        record = {'id': 1, 'test_name': 'test_a', '@range': [3]}
+        assert list(expand_record(record)) == [(index, {'id': 1, 'test_name': 'test_a'}) for index in range(3)]
+
+    def test_matrix_product(self):
+        record = {'id': 1, 'test_params': {'size': 0, 'mode': 'a'},
+                  '@matrix': {'test_params': {'size': [1, 2], 'mode': ['x', 'y', 'z']}}}
+        expanded = [record for _, record in expand_record(record)]
+        assert len(expanded) == 6
+        assert sorted((record['test_params']['size'], record['test_params']['mode']) for record in expanded) == \
+            sorted((size, mode) for size in (1, 2) for mode in 'xyz')
+        # the original record is left untouched
+        assert record['test_params'] == {'size': 0, 'mode': 'a'}
+
+    def test_matrix_range_leaf_and_missing_path(self):
+        record = {'id': 2, '@matrix': {'fixture_binding': {'db': {'params': {'shard': {'@range': [3]}}}}}}
+        expanded = [record for _, record in expand_record(record)]
+        assert [record['fixture_binding']['db']['params']['shard'] for record in expanded] == [0, 1, 2]
+
+    def test_range_on_top_of_a_matrix(self):
+        record = {'id': 3, '@range': [2], '@matrix': {'test_params': {'value': [1, 2, 3]}}}
+        assert [index for index, _ in expand_record(record)] == list(range(6))
+
+    def test_expanded_records_do_not_share_copied_mappings(self):
+        record = {'id': 4, 'test_params': {'fixed': 1}, '@matrix': {'test_params': {'value': [1, 2]}}}
+        first, second = [record for _, record in expand_record(record)]
+        assert first['test_params'] is not second['test_params']
+        assert first['test_params'] == {'fixed': 1, 'value': 1}
+
+    def test_expansion_is_lazy(self):
+        expanded = expand_record({'id': 5, '@range': [10 ** 9]})
+        assert next(expanded) == (0, {'id': 5})
+
+    @pytest.mark.parametrize('record', [
+        {'id': 6, '@range': 'many'},
+        {'id': 6, '@range': [1, 2, 3, 4]},
+        {'id': 6, '@range': [1, 7, 2]},
+        {'id': 6, '@range': 3},
+        {'id': 6, '@range': [True]},
+        {'id': 6, '@range': [1.5]},
+        {'id': 6, '@matrix': [1, 2]},
+        {'id': 6, '@matrix': {'test_params': 3}},
+        {'id': 6, '@matrix': {'test_params': {'value': {'@range': 'x'}}}},
+    ])
+    def test_invalid_directives(self, record):
+        with pytest.raises(ImproperlyConfigured):
+            list(expand_record(record))
@@ -0,0 +1,95 @@
+__author__ = 'orim'
+from pytest_scenario.fixture_cache import FixtureValueCache
+
+
+class _FixtureDef(object):
+    # what the cache uses of pytest's FixtureDef
+
+    def __init__(self, cache, argname='db', scope='function'):
+        self.cache = cache
+        self.argname = argname
+        self.scope = scope
+        self._finalizer = []
+        self.torn_down = []
+
+    def setup(self, value):
+        # pytest caching a fixture value, torn down by its finalizers
+        if not hasattr(self, 'cached_result'):
+            self.cached_result = (value, 0, None)
+            self._finalizer.append(lambda: self.torn_down.append(value))
+        return self.cached_result[0]
+
+    def finish(self):
+        while self._finalizer:
+            self._finalizer.pop()()
+        self.cache.finalized(self)
+        if hasattr(self, 'cached_result'):
+            del self.cached_result
+
+
+class TestFixtureCache:
+
+    def bind(self, cache, fixture_def, params, scope='module'):
+        cache.prepare(fixture_def.argname, fixture_def, scope, params)
+        value = fixture_def.setup(params)
+        cache.stored(fixture_def)
+        return value
+
+    def test_values_are_kept_per_params(self):
+        cache = FixtureValueCache()
+        db = _FixtureDef(cache)
+        assert [self.bind(cache, db, params) for params in ('p1', 'p2', 'p1', 'p2')] == ['p1', 'p2', 'p1', 'p2']
+        assert cache.statistics['db'] == [2, 2, 0]
+        assert db.torn_down == []
+
+    def test_binding_without_params_reuses_the_current_value(self):
+        cache = FixtureValueCache()
+        db = _FixtureDef(cache)
+        assert [self.bind(cache, db, params) for params in ('p1', None, 'p2', None)] == ['p1', 'p1', 'p2', 'p2']
+        assert cache.statistics['db'] == [2, 2, 0]
+
+    def test_scope_is_part_of_the_key(self):
+        cache = FixtureValueCache()
+        db = _FixtureDef(cache)
+        self.bind(cache, db, 'p1')
+        self.bind(cache, db, 'p1', scope='session')
+        assert db.scope == 'session'
+        self.bind(cache, db, 'p1')
+        assert db.scope == 'module'
+        assert cache.statistics['db'] == [1, 2, 0]
+
+    def test_parked_values_are_finalized_with_the_fixture(self):
+        cache = FixtureValueCache()
+        db = _FixtureDef(cache)
+        self.bind(cache, db, 'p1')
+        self.bind(cache, db, 'p2')
+        db.finish()
+        assert sorted(db.torn_down) == ['p1', 'p2']
+        self.bind(cache, db, 'p1')
+        assert cache.statistics['db'] == [0, 3, 0]
+
+    def test_invalidate(self):
+        cache = FixtureValueCache()
+        db = _FixtureDef(cache)
+        self.bind(cache, db, 'p1')
+        self.bind(cache, db, 'p2')
+        cache.invalidate('db')
+        assert db.torn_down == []
+        self.bind(cache, db, 'p1')
+        assert sorted(db.torn_down) == ['p1', 'p2']
+        assert cache.statistics['db'] == [0, 3, 1]
+
+    def test_value_set_up_by_pytest(self):
+        cache = FixtureValueCache()
+        db = _FixtureDef(cache, scope='module')
+        db.setup('default')
+        assert self.bind(cache, db, None) == 'default'
+        assert self.bind(cache, db, 'p1') == 'p1'
+        assert db.torn_down == ['default']
+
+    def test_function_scoped_values_are_not_kept(self):
+        cache = FixtureValueCache()
+        db = _FixtureDef(cache)
+        self.bind(cache, db, 'p1', scope='function')
+        self.bind(cache, db, 'p2', scope='function')
+        assert db.torn_down == ['p1']
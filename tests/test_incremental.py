@@ -0,0 +1,83 @@
+__author__ = 'orim'
+from pytest_scenario.incremental import IncrementalRun
+
+
+def sample():
+    pass
+
+
+class _Item(object):
+
+    def __init__(self, nodeid):
+        self.nodeid = nodeid
+        self.function = sample
+
+    def __repr__(self):
+        return self.nodeid
+
+
+class _Runner(object):
+
+    def __init__(self, tests):
+        self._name = 'main'
+        self.item_setup_dict = {}
+        self.item_tests = {}
+        for order, (nodeid, fixture_binding) in enumerate(tests, 1):
+            self.item_tests[nodeid] = {'id': nodeid, 'order': order, 'test_params': {},
+                                       'fixture_binding': fixture_binding}
+
+
+class _Config(object):
+
+    def __init__(self):
+        self.hook = self
+        self.option = self
+        self.collectonly = False
+        self.deselected = []
+
+    def pytest_deselected(self, items):
+        self.deselected.extend(items)
+
+
+def session_fixture(**params):
+    return {'arg': {'func': 'db', 'scope': 'session', 'params': params or None}}
+
+
+class TestIncremental:
+
+    def plan(self, tmpdir, outcomes, **options):
+        # main-1 sets up the value main-2 reuses, main-3 runs on its own
+        runner = _Runner([('main-1', session_fixture(name='hello')), ('main-2', session_fixture()), ('main-3', {})])
+        items = [_Item(nodeid) for nodeid in sorted(runner.item_tests)]
+        run = IncrementalRun(runner, str(tmpdir), **options)
+        for item in items:
+            run.previous_outcomes[item.nodeid] = [run.fingerprint(item, runner.item_tests[item.nodeid]),
+                                                  outcomes.get(item.nodeid, 'passed'), 1.0]
+        return runner, items, run
+
+    def test_unchanged_instances_are_deselected(self, tmpdir):
+        _, items, run = self.plan(tmpdir, {'main-3': 'failed'}, select_changed=True)
+        config = _Config()
+        run.pytest_collection_modifyitems(config, items)
+        assert [item.nodeid for item in items] == ['main-3']
+        assert [item.nodeid for item in config.deselected] == ['main-1', 'main-2']
+
+    def test_changed_instance_runs_with_the_instance_setting_its_value(self, tmpdir):
+        runner, items, run = self.plan(tmpdir, {}, select_changed=True)
+        runner.item_tests['main-2']['test_params'] = {'name': 'changed'}
+        run.pytest_collection_modifyitems(_Config(), items)
+        assert [item.nodeid for item in items] == ['main-1', 'main-2']
+        assert run.selection == (2, 3)
+
+    def test_failures_first_moves_the_instance_setting_the_value_along(self, tmpdir):
+        _, items, run = self.plan(tmpdir, {'main-2': 'failed', 'main-3': 'failed'}, failfirst=True)
+        run.previous_outcomes['main-3'][2] = 0.5
+        run.pytest_collection_modifyitems(_Config(), items)
+        assert [item.nodeid for item in items] == ['main-3', 'main-1', 'main-2']
+        assert run.moved_ahead == [3, 0]
+
+    def test_failures_first(self, tmpdir):
+        _, items, run = self.plan(tmpdir, {'main-3': 'failed'}, failfirst=True)
+        run.pytest_collection_modifyitems(_Config(), items)
+        assert [item.nodeid for item in items] == ['main-3', 'main-1', 'main-2']
+        assert run.moved_ahead == [1, 0]
@@ -0,0 +1,32 @@
+__author__ = 'orim'
+import pytest
+from pytest_scenario.latency import LatencyHistogram, budget_errors
+
+
+class TestLatency:
+
+    @pytest.mark.parametrize('budget', [{}, {'call': 0.2}, {'setup': {'p99': 1.5, 'max': 3}, 'teardown': {'mean': 1}}])
+    def test_valid_budgets(self, budget):
+        assert budget_errors(budget) == []
+
+    @pytest.mark.parametrize('budget, message', [
+        (0.2, 'should map phases'),
+        ({'run': 1}, "unknown latency_budget phase 'run'"),
+        ({'call': {'p90': 1}}, "unknown latency_budget statistic 'p90'"),
+        ({'call': {'min': 1}}, "unknown latency_budget statistic 'min'"),
+        ({'call': 'fast'}, 'should be a number'),
+        ({'call': {'max': True}}, 'should be a number'),
+    ])
+    def test_invalid_budgets(self, budget, message):
+        errors = budget_errors(budget)
+        assert len(errors) == 1 and message in errors[0]
+
+    def test_histogram_statistics(self):
+        histogram = LatencyHistogram()
+        for duration in range(1, 101):
+            histogram.add(duration / 1000.0)
+        statistics = histogram.statistics()
+        assert statistics['count'] == 100
+        assert statistics['max'] == 0.1
+        assert statistics['p50'] == pytest.approx(0.05, rel=LatencyHistogram.BUCKET_GROWTH - 1)
+        assert statistics['p99'] == pytest.approx(0.099, rel=LatencyHistogram.BUCKET_GROWTH - 1)
@@ -0,0 +1,64 @@
+__author__ = 'orim'
+import json
+import pytest
+from pytest_scenario import loader
+from pytest_scenario.exceptions import ImproperlyConfigured
+
+
+def write_scenario(tmpdir, content, name='scenario.json'):
+    scenario_file = tmpdir.join(name)
+    scenario_file.write(content)
+    return str(scenario_file)
+
+
+class TestLoader:
+
+    @pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 1 << 16])
+    def test_records_spanning_chunks(self, tmpdir, monkeypatch, chunk_size):
+        monkeypatch.setattr(loader, 'CHUNK_SIZE', chunk_size)
+        records = [{'id': index, 'test_name': 'test_%d' % index, 'test_params': {'text': 'x' * index}}
+                   for index in range(20)]
+        path = write_scenario(tmpdir, '[\n' + ',\n'.join(json.dumps(record) for record in records) + '\n]\n')
+        assert list(loader.iter_scenario_records(path)) == records
+
+    def test_line_numbers(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(loader, 'CHUNK_SIZE', 4)
+        path = write_scenario(tmpdir, '[\n  {"id": 1},\n\n  {"id": 2,\n   "skip": true},\n  {"id": 3}\n]')
+        assert [line_number for line_number, _ in loader._iter_json_array(open(path))] == [2, 4, 6]
+
+    def test_unknown_fields_are_dropped(self, tmpdir):
+        path = write_scenario(tmpdir, '[{"id": 1, "comment": "not read", "skip": false}]')
+        assert list(loader.iter_scenario_records(path)) == [{'id': 1, 'skip': False}]
+
+    @pytest.mark.parametrize('content', ['[]', ' [ ] \n', '[{"id": 1}]\n\n'])
+    def test_whitespace_around_the_array(self, tmpdir, content):
+        path = write_scenario(tmpdir, content)
+        assert len(list(loader.iter_scenario_records(path))) == content.count('{')
+
+    @pytest.mark.parametrize('content, message', [
+        ('', 'should be a JSON array'),
+        ('{"id": 1}', 'should be a JSON array'),
+        ('[{"id": 1}', 'unexpected end of scenario'),
+        ('[{"id": 1} {"id": 2}]', "expected ','"),
+        ('[{"id": 1},]', 'invalid test case record'),
+        ('[{"id": 1, }]', 'invalid test case record'),
+        ('[{"id": 1}, 2]', 'is not a JSON object'),
+        ('[{"id": 1}]]', 'unexpected content after'),
+        ('[] trailing', 'unexpected content after'),
+    ])
+    def test_malformed_scenarios(self, tmpdir, monkeypatch, content, message):
+        monkeypatch.setattr(loader, 'CHUNK_SIZE', 3)
+        path = write_scenario(tmpdir, content)
+        with pytest.raises(ImproperlyConfigured) as excinfo:
+            list(loader.iter_scenario_records(path))
+        assert message in str(excinfo.value)
+
+    def test_json_lines(self, tmpdir):
+        path = write_scenario(tmpdir, '{"id": 1}\n\n{"id": 2, "xfail": true}\n', name='scenario.jsonl')
+        assert list(loader.iter_scenario_records(path)) == [{'id': 1}, {'id': 2, 'xfail': True}]
+
+    def test_invalid_json_line(self, tmpdir):
+        path = write_scenario(tmpdir, '{"id": 1}\n{"id": \n', name='scenario.jsonl')
+        with pytest.raises(ImproperlyConfigured) as excinfo:
+            list(loader.iter_scenario_records(path))
+        assert 'scenario.jsonl:2' in str(excinfo.value)
@@ -0,0 +1,52 @@
+__author__ = 'orim'
+import pickle
+import pytest
+from pytest_scenario.params import FixtureParams, intern_params
+
+
+class TestParams:
+
+    def test_none(self):
+        assert intern_params(None) is None
+
+    def test_equal_params_are_interned(self):
+        first = intern_params({'host': 'a', 'ports': [1, 2], 'nested': {'x': 1}})
+        second = intern_params({'nested': {'x': 1}, 'ports': [1, 2], 'host': 'a'})
+        assert first is second
+        assert first.ports == (1, 2)
+        assert first.nested is intern_params({'x': 1})
+
+    def test_pairs_and_mappings_intern_alike(self):
+        assert intern_params([('num', 100)]) is intern_params({'num': 100})
+
+    def test_equal_values_of_different_types_are_not_shared(self):
+        assert intern_params({'value': 1}) is not intern_params({'value': True})
+        assert intern_params({'value': 1}) is not intern_params({'value': 1.0})
+        assert intern_params({'value': (1,)}) is not intern_params({'value': (True,)})
+
+    def test_attribute_and_key_access(self):
+        params = intern_params({'num': 100})
+        assert params.num == params['num'] == 100
+        assert dict(params) == {'num': 100}
+        assert params == {'num': 100}
+        with pytest.raises(AttributeError):
+            params.missing
+
+    def test_read_only(self):
+        params = intern_params({'num': 100})
+        with pytest.raises(AttributeError):
+            params.num = 1
+        with pytest.raises(TypeError):
+            params['num'] = 1
+
+    def test_hashable(self):
+        assert {intern_params({'num': 1}): 'one'}[intern_params({'num': 1})] == 'one'
+
+    def test_unhashable_values_are_not_shared(self):
+        first = intern_params({'value': {1, 2}})
+        assert isinstance(first, FixtureParams)
+        assert first is not intern_params({'value': {1, 2}})
+
+    def test_pickled_params_are_interned_again(self):
+        params = intern_params({'num': 7})
+        assert pickle.loads(pickle.dumps(params)) is params
@@ -0,0 +1,63 @@
+__author__ = 'orim'
+import json
+import pytest
+from pytest_scenario import plugin
+from pytest_scenario.exceptions import ImproperlyConfigured
+
+
+def record(record_id, test_name='test_sample'):
+    return {'id': record_id, 'module_name': 'tests.sample', 'class_name': 'TestSample', 'test_name': test_name,
+            'test_params': {}, 'fixture_binding': {}, 'skip': False, 'xfail': False}
+
+
+class TestPlan:
+
+    @pytest.fixture
+    def scenarios(self, tmpdir, monkeypatch):
+        # scenario name -> records, written to a sut/scenarios directory the runner is built over
+        scenarios_dir = tmpdir.mkdir('sut').mkdir('scenarios')
+        monkeypatch.chdir(tmpdir)
+
+        def write(**scenarios):
+            for scenario_name, records in scenarios.items():
+                scenarios_dir.join(scenario_name + '.json').write(json.dumps(records))
+        return write
+
+    def test_circular_reference(self, scenarios):
+        scenarios(a=[record(1), {'id': 2, '@ref': 'b'}], b=[{'id': 1, '@ref': 'a'}])
+        with pytest.raises(ImproperlyConfigured) as excinfo:
+            plugin.TestScenarioRunner('a')
+        assert str(excinfo.value) == 'circular scenario reference in a-2.b-1: a -> b -> a'
+
+    def test_self_reference(self, scenarios):
+        scenarios(a=[{'id': 1, '@ref': 'a'}])
+        with pytest.raises(ImproperlyConfigured) as excinfo:
+            plugin.TestScenarioRunner('a')
+        assert 'circular scenario reference in a-1: a -> a' in str(excinfo.value)
+
+    def test_repeated_reference(self, scenarios, monkeypatch):
+        scenarios(c=[record(1), record(2, 'test_other')], d=[{'id': 1, '@ref': 'c'}, record(2), {'id': 3, '@ref': 'c'}])
+        parsed = []
+        iter_scenario = plugin.TestScenarioRunner.iter_scenario
+        monkeypatch.setattr(plugin.TestScenarioRunner, 'iter_scenario',
+                            lambda runner, scenario_name: parsed.append(scenario_name) or
+                            iter_scenario(runner, scenario_name))
+        runner = plugin.TestScenarioRunner('d')
+        # the sub-scenario is parsed once and every reference gets instances of its own, in scenario order
+        assert sorted(parsed) == ['c', 'd']
+        tests = sorted(runner.tests_dict.values(), key=lambda test: test['order'])
+        assert [(test['id'], test['scenario']) for test in tests] == [
+            ('d-1.c-1', 'd-1.c'), ('d-1.c-2', 'd-1.c'), ('d-2', 'd'), ('d-3.c-1', 'd-3.c'), ('d-3.c-2', 'd-3.c')]
+        assert len(set(id(test) for test in tests)) == len(tests)
+        assert runner.scenario_configs == {}
+
+    def test_sibling_scenarios_may_reference_the_same_scenario(self, scenarios):
+        scenarios(c=[record(1)], e=[{'id': 1, '@ref': 'c'}], f=[{'id': 1, '@ref': 'e'}, {'id': 2, '@ref': 'c'}])
+        runner = plugin.TestScenarioRunner('f')
+        assert sorted(test['id'] for test in runner.tests_dict.values()) == ['f-1.e-1.c-1', 'f-2.c-1']
+
+    def test_undefined_scenario(self, scenarios):
+        scenarios(a=[{'id': 1, '@ref': 'missing'}])
+        with pytest.raises(RuntimeError) as excinfo:
+            plugin.TestScenarioRunner('a')
+        assert "'missing' scenario is not defined" in str(excinfo.value)
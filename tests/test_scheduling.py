@@ -0,0 +1,131 @@
+__author__ = 'orim'
+import json
+from pytest_scenario import plugin
+from pytest_scenario.scheduling import count_fixture_switches, group_by_fixtures, partition, scheduling_units
+
+
+class _Item(object):
+
+    def __init__(self, nodeid):
+        self.nodeid = nodeid
+
+    def __repr__(self):
+        return self.nodeid
+
+
+def plan(*tests):
+    # (nodeid, extra record fields) -> items in order and their tests
+    items = []
+    item_tests = {}
+    for order, (nodeid, fields) in enumerate(tests, 1):
+        items.append(_Item(nodeid))
+        item_tests[nodeid] = dict(fields, order=order)
+    return items, item_tests
+
+
+def binding(func, scope='module', **params):
+    return {'fixture_binding': {'arg': {'func': func, 'scope': scope, 'params': params or None}}}
+
+
+def record(record_id, fixture_binding=None, **fields):
+    record = {'id': record_id, 'module_name': 'tests.sample', 'class_name': 'TestSample', 'test_name': 'test_sample',
+              'test_params': {}, 'fixture_binding': fixture_binding or {}, 'skip': False, 'xfail': False}
+    record.update(fields)
+    return record
+
+
+class _Config(object):
+
+    def __init__(self):
+        self.hook = self
+        self.deselected = []
+
+    def pytest_deselected(self, items):
+        self.deselected.extend(items)
+
+
+class TestScheduling:
+
+    def test_independent_instances_are_units_of_their_own(self):
+        items, item_tests = plan(('a', {}), ('b', {}), ('c', {}))
+        assert scheduling_units(items, item_tests) == [[item] for item in items]
+
+    def test_serial_groups_stay_together(self):
+        items, item_tests = plan(('a', {'serial_group': 's'}), ('b', {}), ('c', {'serial_group': 's'}))
+        assert [[item.nodeid for item in unit] for unit in scheduling_units(items, item_tests)] == [['a', 'c'], ['b']]
+
+    def test_depends_on_links_dependents_to_their_dependency(self):
+        items, item_tests = plan(('a', {}), ('b', {}), ('c', {'depends_on': [(1, 2)]}), ('d', {}))
+        assert [[item.nodeid for item in unit] for unit in scheduling_units(items, item_tests)] == \
+            [['a', 'b', 'c'], ['d']]
+
+    def test_depends_on_outside_the_items(self):
+        items, item_tests = plan(('a', {}), ('b', {'depends_on': [(7, 9)]}))
+        assert len(scheduling_units(items, item_tests)) == 2
+
+    def test_concurrency_groups_stay_together(self):
+        items, item_tests = plan(('a', {'concurrency_group': 'g'}), ('b', {}), ('c', {'concurrency_group': 'g'}))
+        assert [[item.nodeid for item in unit] for unit in scheduling_units(items, item_tests)] == [['a', 'c'], ['b']]
+
+    def test_bindings_without_params_join_the_instance_setting_the_value(self):
+        items, item_tests = plan(('a', binding('db', x=1)), ('b', binding('db', x=2)), ('c', binding('db')),
+                                 ('d', binding('db')), ('e', binding('db', 'session')), ('f', {}))
+        assert [[item.nodeid for item in unit] for unit in scheduling_units(items, item_tests)] == \
+            [['a'], ['b', 'c', 'd'], ['e'], ['f']]
+
+    def test_partition_balances_by_weight(self):
+        units = [['a'] * 5, ['b'] * 4, ['c'] * 3, ['d'] * 3, ['e'] * 1]
+        assignment = partition(units, 2)
+        assert sorted(sum(len(unit) for unit in units) for units in assignment) == [8, 8]
+        assert sorted(unit[0] for units in assignment for unit in units) == list('abcde')
+
+    def test_partition_is_deterministic_and_may_leave_partitions_empty(self):
+        units = [['a'], ['b']]
+        assert partition(units, 3) == partition(units, 3)
+        assert sorted(len(units) for units in partition(units, 3)) == [0, 1, 1]
+
+    def test_partition_custom_weight(self):
+        durations = {'slow': 10.0, 'fast': 1.0}
+        units = [['slow'], ['fast'], ['fast'], ['fast']]
+        assignment = partition(units, 2, weight=lambda unit: sum(durations[name] for name in unit))
+        assert sorted(assignment, key=len) == [[['slow']], [['fast'], ['fast'], ['fast']]]
+
+    def test_shards_keep_bindings_without_params_with_their_value(self, tmpdir, monkeypatch):
+        scenarios_dir = tmpdir.mkdir('sut').mkdir('scenarios')
+        session_fixture = lambda **params: {'arg': {'func': 'db', 'scope': 'session', 'params': params or None}}
+        scenarios_dir.join('main.json').write(json.dumps(
+            [record(1, session_fixture(name='hello')), record(2), record(3), {'id': 4, '@ref': 'sub'}, record(5)]))
+        scenarios_dir.join('sub.json').write(json.dumps([record(1, session_fixture()), record(2)]))
+        monkeypatch.chdir(tmpdir)
+        runner = plugin.TestScenarioRunner('main')
+        items = [_Item(test['id']) for test in sorted(runner.tests_dict.values(), key=lambda test: test['order'])]
+        runner.item_tests = {test['id']: test for test in runner.tests_dict.values()}
+        shards = []
+        for shard_index in (1, 2):
+            runner.shard = (shard_index, 2)
+            shard_items = list(items)
+            runner.select_shard(_Config(), shard_items)
+            shards.append([item.nodeid for item in shard_items])
+        assert sorted(sum(shards, [])) == sorted(item.nodeid for item in items)
+        assert any({'main-1', 'main-4.sub-1'} <= set(shard) for shard in shards)
+
+
+class TestFixtureSchedule:
+
+    def test_group_by_fixtures(self):
+        items, item_tests = plan(('a', binding('db', x=1)), ('b', binding('db', x=2)), ('c', binding('db', x=1)))
+        assert [item.nodeid for item in group_by_fixtures(items, item_tests)] == ['a', 'c', 'b']
+
+    def test_bindings_without_params_keep_their_value(self):
+        items, item_tests = plan(('a', binding('db', x='hello')), ('c', binding('db')), ('b', binding('db', x='bye')),
+                                 ('e', binding('db')), ('f', binding('db', x='hello')))
+        assert [item.nodeid for item in group_by_fixtures(items, item_tests)] == ['a', 'c', 'f', 'b', 'e']
+
+    def test_count_fixture_switches(self):
+        tests = [binding('db', x=1), binding('db', x=2), binding('db', x=1), binding('db', 'function', x=1)]
+        assert count_fixture_switches(tests) == 3
+        assert count_fixture_switches([tests[0], tests[2], tests[1]]) == 2
+
+    def test_count_fixture_switches_without_params(self):
+        tests = [binding('db'), binding('db', x=1), binding('db'), binding('db', 'session'), binding('db', x=1)]
+        assert count_fixture_switches(tests) == 4
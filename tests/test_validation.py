@@ -0,0 +1,97 @@
+__author__ = 'orim'
+import json
+import textwrap
+import pytest
+from pytest_scenario.validation import ScenarioValidator
+
+TEST_MODULE = '''
+import pytest
+from elsewhere import RemoteBase
+
+
+@pytest.fixture
+def setup_value():
+    return 1
+
+
+class Base(object):
+
+    @pytest.fixture
+    def base_value(self):
+        return 2
+
+    def test_inherited(self, base_value):
+        pass
+
+
+class TestDerived(Base):
+
+    @pytest.mark.parametrize('extra, other', [(1, 2)])
+    def test_marked(self, extra, other, setup_value):
+        pass
+
+    @pytest.mark.parametrize(['listed'], [(1,)])
+    def test_listed(self, listed):
+        pass
+
+    def test_missing(self, unknown):
+        pass
+
+
+@pytest.mark.parametrize('flag', [True])
+class TestClassMarked(object):
+
+    def test_flag(self, flag):
+        pass
+
+
+class TestRemote(RemoteBase):
+
+    def test_own(self, remote_value):
+        pass
+'''
+
+
+def record(test_name, class_name='TestDerived', **fields):
+    record = {'id': test_name, 'module_name': 'sample', 'class_name': class_name, 'test_name': test_name,
+              'test_params': {}, 'fixture_binding': {}, 'skip': False, 'xfail': False}
+    record.update(fields)
+    return record
+
+
+class TestValidation:
+
+    @pytest.fixture
+    def validate(self, tmpdir):
+        tmpdir.join('sample.py').write(textwrap.dedent(TEST_MODULE))
+        scenarios_dir = tmpdir.mkdir('scenarios')
+
+        def validate(*records):
+            scenarios_dir.join('scenario.json').write(json.dumps(list(records)))
+            return ScenarioValidator(str(scenarios_dir), [str(tmpdir)], str(tmpdir)).validate(['scenario'])
+        return validate
+
+    def test_inherited_test(self, validate):
+        assert validate(record('test_inherited')) == []
+
+    def test_parametrize_argnames(self, validate):
+        assert validate(record('test_marked'), record('test_listed'), record('test_flag', 'TestClassMarked')) == []
+
+    def test_missing_fixture(self, validate):
+        errors = validate(record('test_missing'))
+        assert len(errors) == 1 and "fixture 'unknown' of sample.TestDerived.test_missing not found" in errors[0]
+
+    def test_missing_test(self, validate):
+        errors = validate(record('test_nothing'))
+        assert len(errors) == 1 and "test 'test_nothing' not found" in errors[0]
+
+    def test_unresolved_base_is_skipped(self, validate):
+        assert validate(record('test_own', 'TestRemote'), record('test_remote_only', 'TestRemote')) == []
+
+    def test_invalid_argument(self, validate):
+        errors = validate(record('test_marked', test_params={'nope': 1}))
+        assert len(errors) == 1 and "'nope' is not a valid argument" in errors[0]
+
+    def test_latency_budget(self, validate):
+        errors = validate(record('test_inherited', latency_budget={'call': {'p90': 1}}))
+        assert len(errors) == 1 and "unknown latency_budget statistic 'p90'" in errors[0]